@@ -1,31 +1,61 @@
 import os
 import shutil
-import tempfile
 import asyncio
 import traceback
 import json
-from typing import List
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+import hashlib
+import random
+import math
+import itertools
+import time
+import weakref
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timezone
+import re
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader, PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema.document import Document
-from langchain.schema import Document as LCDocument
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
+import jwt
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+from langchain_core.documents import Document as LCDocument
+from chunk_store import ChunkStore, parse_chunk_id
+from query_cache import QueryCache
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from context_packing import count_tokens, pack_context
+from embedding_cache import CachedEmbeddings
+from jobs import IngestionJob, JobManager
+from pdf_loader import stream_pdf_pages
+from json_stream import JsonArrayStreamParser
+from clients import ClientRegistry
+from single_flight import SingleFlight
+from item_bank import ItemBank
+from vector_backends import LocalVectorBackend, PineconeBackend, VectorBackend
+from metrics import finish_request_timings, metrics, server_timing_header, start_request_timings
+from profiler import SamplingProfiler
+from upload_buffer import UploadTooLarge, receive_upload
+from scheduler import GENERATION, INGESTION, INTERACTIVE, Scheduler, is_retryable
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect to OpenAI/Pinecone in the background so startup never blocks on the network
+    start_backend_init()
+    yield
+    if embeddings is not None:
+        await asyncio.to_thread(embeddings.flush)
+    await clients.aclose()
+
 app = FastAPI(
     title="RAG API", 
     description="API for document upload and RAG querying",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -34,61 +64,229 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Add a Server-Timing header with per-stage durations to every response
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() == "true"
+# Expose /debug/profiler to start and stop the sampling profiler at runtime
+PROFILER_ENDPOINT = os.getenv("PROFILER_ENDPOINT", "false").lower() == "true"
+profiler = SamplingProfiler(interval=float(os.getenv("PROFILER_INTERVAL_MS", "10")) / 1000)
+
+metrics.describe("stage_duration_seconds", "histogram", "Time spent in each pipeline stage")
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency (time to first byte for streams)")
+metrics.describe("llm_tokens_total", "counter", "Prompt and completion tokens reported by OpenAI")
+metrics.describe("embedding_tokens_estimated_total", "counter", "Estimated tokens sent for document embedding")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    token = start_request_timings()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = finish_request_timings(token)
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.observe("http_request_duration_seconds", elapsed, method=request.method, path=path)
+        metrics.inc("http_requests_total", method=request.method, path=path, status=status)
+    if TIMING_HEADERS:
+        # Streaming responses only report the stages that ran before their first byte
+        response.headers["Server-Timing"] = server_timing_header({**timings, "total": elapsed})
+    return response
+
 DATA_PATH = "data"
 
-required_env_vars = ["PINECONE_API_KEY", "OPENAI_API_KEY"]
+# Upper bound on concurrent outbound vector index calls per worker (OpenAI calls go through the schedulers below)
+BACKEND_CONCURRENCY = int(os.getenv("BACKEND_CONCURRENCY", "16"))
+backend_limiter = asyncio.Semaphore(BACKEND_CONCURRENCY)
+
+# "pinecone" (default) or "local" for the in-process index in LOCAL_INDEX_PATH
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+if VECTOR_BACKEND not in ("pinecone", "local"):
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+required_env_vars = ["OPENAI_API_KEY"] + (["PINECONE_API_KEY"] if VECTOR_BACKEND == "pinecone" else [])
 missing_vars = [var for var in required_env_vars if not os.getenv(var)]
 if missing_vars:
     raise ValueError(f"Missing required environment variables: {missing_vars}")
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small", dimensions=1536)
-
-try:
-    _ = embeddings.embed_query("ping")
-except Exception as e:
-    raise RuntimeError(f"OpenAI embeddings init failed: {e}")
-
 INDEX_NAME = os.getenv("PINECONE_INDEX", "neo-docs")
+EMBEDDING_DIMENSION = 1536
+
+# Clients are created on first use (langchain_openai / langchain_pinecone are
+# slow to import), pooled for the life of the process, and the index is looked
+# up once per process.
+clients = ClientRegistry()
+embeddings = None
+vectorstore = None
+index_dimension = None
+backend_state = {"ready": False, "error": None, "started_at": None, "ready_at": None}
+_backend_init_task = None
+_index_lock = asyncio.Lock()
+_vectorstore_lock = asyncio.Lock()
+
+def get_embeddings():
+    global embeddings
+    if embeddings is None:
+        embeddings = CachedEmbeddings(
+            clients.embeddings("text-embedding-3-small", EMBEDDING_DIMENSION),
+            path=os.getenv("EMBEDDING_CACHE_PATH", "/tmp/neo-embeddings.sqlite3"),
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            scheduler=embedding_scheduler,
+            estimate_tokens=estimate_tokens,
+        )
+    return embeddings
 
-
-try:
-    pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
-except Exception as e:
-    raise ValueError(f"Failed to initialize Pinecone client: {e}")
-
-try:
-    if INDEX_NAME not in {i.name for i in pc.list_indexes().indexes}:
-        pc.create_index(
+def get_pinecone():
+    try:
+        return clients.pinecone()
+    except Exception as e:
+        raise ValueError(f"Failed to initialize Pinecone client: {e}")
+
+def get_index():
+    return clients.index(INDEX_NAME)
+
+async def ensure_index() -> None:
+    """Create the Pinecone index if needed and cache its dimension; runs once per process"""
+    global index_dimension
+    if index_dimension is not None:
+        return
+    async with _index_lock:
+        if index_dimension is not None:
+            return
+        client = get_pinecone()
+        indexes = {i.name: i for i in (await asyncio.to_thread(client.list_indexes)).indexes}
+        if INDEX_NAME in indexes:
+            index_dimension = indexes[INDEX_NAME].dimension
+            return
+        from pinecone import ServerlessSpec
+        await asyncio.to_thread(
+            client.create_index,
             name=INDEX_NAME,
-            dimension=1536,  # must match your embeddings dimension
+            dimension=EMBEDDING_DIMENSION,  # must match your embeddings dimension
             metric="cosine",
             spec=ServerlessSpec(
                 cloud=os.getenv("PINECONE_CLOUD", "aws"),
                 region=os.getenv("PINECONE_REGION", "us-east-1"),
             ),
         )
-except Exception as e:
-    print(f"Warning: Could not create Pinecone index: {e}")
+        index_dimension = EMBEDDING_DIMENSION
+
+async def get_vectorstore() -> VectorBackend:
+    """The vector index selected by VECTOR_BACKEND, created on first use"""
+    global vectorstore
+    if vectorstore is not None:
+        return vectorstore
+    async with _vectorstore_lock:
+        if vectorstore is None:
+            try:
+                if VECTOR_BACKEND == "local":
+                    vectorstore = await asyncio.to_thread(
+                        LocalVectorBackend,
+                        os.getenv("LOCAL_INDEX_PATH", "/tmp/neo-vectors"),
+                        EMBEDDING_DIMENSION,
+                        int(os.getenv("LOCAL_INDEX_HNSW_THRESHOLD", "50000")),
+                    )
+                else:
+                    await ensure_index()
+                    index = await asyncio.to_thread(get_index)
+                    vectorstore = PineconeBackend(index, index_dimension)
+            except Exception as e:
+                print(f"Warning: Could not initialize vectorstore: {e}")
+                raise HTTPException(status_code=500, detail=f"Vectorstore not initialized: {e}")
+    return vectorstore
+
+def get_chat_model(temperature: Optional[float] = None):
+    return clients.chat_model("gpt-4o", temperature)
+
+async def initialize_backends() -> None:
+    """Warm up the OpenAI and Pinecone clients concurrently and record readiness"""
+    backend_state["started_at"] = time.time()
+    try:
+        await asyncio.gather(
+            get_vectorstore(),
+            get_embeddings().aembed_query("ping"),
+            asyncio.to_thread(count_tokens, ""),
+        )
+        backend_state.update(ready=True, error=None, ready_at=time.time())
+        print(f"Backends ready in {backend_state['ready_at'] - backend_state['started_at']:.2f}s")
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        backend_state.update(ready=False, error=detail)
+        print(f"Warning: Backend initialization failed: {detail}")
+
+def start_backend_init():
+    """Start (or restart after a failure) background backend initialization"""
+    global _backend_init_task
+    if _backend_init_task is None or (_backend_init_task.done() and not backend_state["ready"]):
+        _backend_init_task = asyncio.ensure_future(initialize_backends())
+    return _backend_init_task
+
+chunk_store = ChunkStore(os.getenv("CHUNK_STORE_PATH", "/tmp/neo-chunks.sqlite3"))
+
+# BM25 over the same chunks; namespaces not in memory (never ingested here, or evicted) are loaded from the chunk store
+keyword_index = KeywordIndex(
+    loader=lambda namespace: chunk_store.get_chunks(namespace=namespace),
+    max_namespaces=int(os.getenv("KEYWORD_INDEX_NAMESPACES", "64")),
+)
 
-try:
-    vectorstore = PineconeVectorStore.from_existing_index(
-        index_name=INDEX_NAME,
-        embedding=embeddings
-    )
-except Exception as e:
-    print(f"Warning: Could not initialize vectorstore: {e}")
-    vectorstore = None
+ingestion_jobs = JobManager(max_workers=int(os.getenv("INGESTION_WORKERS", "2")))
+
+# Flashcards and quiz questions generated ahead of demand after each upload
+item_bank = ItemBank(os.getenv("ITEM_BANK_PATH", "/tmp/neo-bank.sqlite3"))
+bank_jobs = JobManager(max_workers=int(os.getenv("BANK_WORKERS", "1")))
+_bank_builds = {}
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("QUERY_CACHE_THRESHOLD", "0.95")),
+)
+
+# Identical concurrent flashcard/quiz requests share one generation; with
+# GENERATION_CACHE_TTL > 0 the result is also reused for that many seconds
+generation_flight = SingleFlight(ttl_seconds=float(os.getenv("GENERATION_CACHE_TTL", "0")))
+
+def cache_gauges() -> dict:
+    """Current cache and coalescing counters, exported on /metrics as gauges"""
+    sources = {
+        "query_cache": query_cache.stats(),
+        "embedding_cache": embeddings.stats() if embeddings is not None else {},
+        "generation": generation_flight.stats(),
+    }
+    return {
+        f"{prefix}_{name}": value
+        for prefix, stats in sources.items()
+        for name, value in stats.items()
+        if isinstance(value, (int, float))
+    }
+
+metrics.register_gauges(cache_gauges)
+metrics.register_gauges(lambda: {"profiler_running": int(profiler.running)})
+
+def document_version(namespace: str = "") -> tuple:
+    """Changes whenever the namespace's document is replaced or cleared (tracked by the query cache)"""
+    return query_cache.version(namespace)
 
 # Response models
 class UploadResponse(BaseModel):
     message: str
     documents_processed: int
+    job_id: Optional[str] = None
+    warning: Optional[str] = None  # the index did not confirm the new vectors in time
 
 class QueryResponse(BaseModel):
     response: str
     sources: List[str]
+    context_tokens: Optional[int] = None  # tokens of retrieved context in the prompt
+    context_tokens_saved: Optional[int] = None  # vs. the top chunks joined unpacked
+
+class QueryBatchRequest(BaseModel):
+    questions: List[str]
 
 class FlashcardRequest(BaseModel):
     num_flashcards: int = 5
@@ -106,6 +304,7 @@ class FlashcardResponse(BaseModel):
 class QuizRequest(BaseModel):
     num_questions: int = 8
     difficulty: str = "easy"  # easy, medium, hard
+    parallel: bool = False  # generate per document section concurrently
 
 class QuizQuestion(BaseModel):
     question: str
@@ -187,17 +386,22 @@ def load_documents():
     """Load documents from data directory - only works in local development"""
     if not os.path.exists(DATA_PATH):
         raise HTTPException(status_code=404, detail="Data directory not found. This endpoint only works in local development.")
+    from langchain_community.document_loaders import PyPDFDirectoryLoader
     document_loader = PyPDFDirectoryLoader(DATA_PATH)
     return document_loader.load()
 
 def split_documents(documents: list[Document]):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=800,
         chunk_overlap=80,
         length_function=len,
         is_separator_regex=False,
     )
-    return text_splitter.split_documents(documents)
+    with metrics.timer("split_documents"):
+        chunks = text_splitter.split_documents(documents)
+    metrics.inc("chunks_split_total", len(chunks))
+    return chunks
 
 # def add_to_pinecone(chunks: list[Document]):
 #     """Add documents to Pinecone vectorstore"""
@@ -235,39 +439,338 @@ def split_documents(documents: list[Document]):
 #         print("No new documents to add")
 
 UPSERT_BATCH = 100
+DELETE_BATCH = 1000
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+BACKOFF_ATTEMPTS = int(os.getenv("BACKOFF_ATTEMPTS", "4"))
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))
+READY_SAMPLE_IDS = int(os.getenv("READY_SAMPLE_IDS", "100"))
+GENERATION_ROUNDS = int(os.getenv("GENERATION_ROUNDS", "3"))
+QUIZ_SECTIONS = int(os.getenv("QUIZ_SECTIONS", "4"))
+QUESTION_DEDUP_THRESHOLD = float(os.getenv("QUESTION_DEDUP_THRESHOLD", "0.9"))
+GENERATION_CONTEXT_TOKENS = int(os.getenv("GENERATION_CONTEXT_TOKENS", "6000"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+QUERY_CONTEXT_TOKENS = int(os.getenv("QUERY_CONTEXT_TOKENS", "1500"))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "50"))
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+# Bank size per kind and difficulty; 0 disables the bank
+BANK_ITEMS_PER_DIFFICULTY = int(os.getenv("BANK_ITEMS_PER_DIFFICULTY", "0"))
+DIFFICULTIES = ["easy", "medium", "hard"]
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Uploads up to this size are parsed from memory instead of a temp file
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_MB", "16")) * 1024 * 1024
+# Completion tokens reserved per chat call before the real count is known
+LLM_OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "800"))
+# Waiting calls allowed per priority (interactive, generation, ingestion) before rejecting with 503
+SCHEDULER_QUEUE_LIMITS = tuple(int(n) for n in os.getenv("SCHEDULER_QUEUE_LIMITS", "64,16,1024").split(","))
+
+# OpenAI calls are admitted by priority (chat, then flashcard/quiz generation,
+# then ingestion and bank building) within the account's quota. Set the RPM/TPM
+# variables to the quota of your OpenAI tier; 0 leaves that limit off.
+llm_scheduler = Scheduler(
+    "chat model",
+    concurrency=int(os.getenv("LLM_CONCURRENCY", str(BACKEND_CONCURRENCY))),
+    requests_per_minute=float(os.getenv("OPENAI_CHAT_RPM", "0")),
+    tokens_per_minute=float(os.getenv("OPENAI_CHAT_TPM", "0")),
+    queue_limits=SCHEDULER_QUEUE_LIMITS,
+    attempts=BACKOFF_ATTEMPTS,
+)
+embedding_scheduler = Scheduler(
+    "embeddings",
+    concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", str(BACKEND_CONCURRENCY))),
+    requests_per_minute=float(os.getenv("OPENAI_EMBEDDING_RPM", "0")),
+    tokens_per_minute=float(os.getenv("OPENAI_EMBEDDING_TPM", "0")),
+    queue_limits=SCHEDULER_QUEUE_LIMITS,
+    attempts=BACKOFF_ATTEMPTS,
+)
+
+def scheduler_gauges() -> dict:
+    gauges = {}
+    for prefix, scheduler in (("llm_scheduler", llm_scheduler), ("embedding_scheduler", embedding_scheduler)):
+        stats = scheduler.stats()
+        gauges[f"{prefix}_active"] = stats["active"]
+        for priority, waiting in stats["waiting"].items():
+            gauges[f"{prefix}_{priority}_waiting"] = waiting
+            for name, value in stats[priority].items():
+                gauges[f"{prefix}_{priority}_{name}"] = value
+    return gauges
+
+metrics.register_gauges(scheduler_gauges)
+
+async def embed_texts(texts: List[str], priority: int) -> List[List[float]]:
+    """Embed `texts`; cache misses go through the embedding scheduler (with retries)"""
+    return await get_embeddings().aembed_documents(texts, priority=priority)
+
+async def embed_query_text(text: str, priority: int = INTERACTIVE) -> List[float]:
+    return await get_embeddings().aembed_query(text, priority=priority)
 
-def add_to_pinecone(chunks: List[LCDocument]) -> None:
-    chunks = calculate_chunk_ids(chunks)
+async def invoke_chat(model, prompt: str, priority: int):
+    """One chat completion through the LLM scheduler (with retries)"""
+    return await llm_scheduler.run(lambda: model.ainvoke(prompt), priority, chat_tokens(prompt))
+
+async def stream_chat(model, prompt: str, priority: int) -> AsyncIterator:
+    """
+    Stream a chat completion through the LLM scheduler. A task reads the
+    model into a queue while holding the scheduler slot, so the slot is
+    released when the model finishes rather than when a slow client has
+    read every chunk; the queue never holds more than one completion.
+    """
+    queue = asyncio.Queue()
+    finished = object()
+
+    async def read():
+        try:
+            async with llm_scheduler.slot(priority, chat_tokens(prompt)):
+                async for chunk in model.astream(prompt):
+                    queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(finished)
+
+    reader = asyncio.create_task(read())
+    try:
+        while (chunk := await queue.get()) is not finished:
+            yield chunk
+        await reader  # raises what the model call raised
+    finally:
+        if not reader.done():
+            reader.cancel()
+        elif not reader.cancelled():
+            reader.exception()  # consumed even when the caller stopped early
+
+def chat_tokens(prompt: str) -> int:
+    """Tokens a chat call is charged against the TPM budget"""
+    return estimate_tokens(str(prompt)) + LLM_OUTPUT_TOKENS
+
+async def run_limited(coro):
+    """Await an outbound backend call while holding a slot of the concurrency limiter"""
+    async with backend_limiter:
+        return await coro
+
+async def with_backoff(make_call, attempts: int = BACKOFF_ATTEMPTS, base_delay: float = 0.5):
+    """Retry an async call with exponential, jittered backoff (rate limits, transient errors)"""
+    for attempt in range(attempts):
+        try:
+            return await make_call()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"Backend call failed ({e}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def check_index_dimension() -> VectorBackend:
+    """Return the vector index after verifying its dimension (looked up once per process)"""
+    store = await get_vectorstore()
+    if store.dimension != EMBEDDING_DIMENSION:
+        raise HTTPException(
+            status_code=500, detail=f"Vector index dim {store.dimension} != {EMBEDDING_DIMENSION}"
+        )
+    return store
+
+async def embedding_batches(
+    chunk_lists: AsyncIterator[List[LCDocument]], max_tokens: int = EMBED_BATCH_TOKENS
+) -> AsyncIterator[List[LCDocument]]:
+    """Regroup a stream of chunk lists into embedding requests of at most `max_tokens` estimated tokens"""
+    current = []
+    current_tokens = 0
+    async for chunks in chunk_lists:
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk.page_content)
+            if current and current_tokens + tokens > max_tokens:
+                yield current
+                current = []
+                current_tokens = 0
+            current.append(chunk)
+            current_tokens += tokens
+    if current:
+        yield current
+
+async def _single_list(chunks: List[LCDocument]) -> AsyncIterator[List[LCDocument]]:
+    yield chunks
+
+async def add_to_pinecone(
+    chunks: Union[List[LCDocument], AsyncIterator[List[LCDocument]]],
+    job: Optional[IngestionJob] = None,
+    namespace: str = "",
+) -> int:
+    """
+    Embed and upsert chunks into `namespace` as a pipeline: up to
+    EMBED_CONCURRENCY embedding requests run at once and feed a queue drained
+    by UPSERT_CONCURRENCY upsert workers, so upserting batch N overlaps with
+    embedding batch N+1.
+
+    `chunks` may also be an async iterator of chunk lists (e.g. page ranges
+    as they are parsed). All of them go through this one pipeline, so
+    embedding batches fill up across ranges and the concurrency limits hold
+    for the whole upload; reading the next list waits while every embedding
+    slot is busy. Returns the number of chunks added.
+    """
+    if isinstance(chunks, list):
+        if not chunks:
+            return 0
+        if not all("id" in c.metadata for c in chunks):
+            chunks = calculate_chunk_ids(chunks)
+        chunks = _single_list(chunks)
 
-    texts = [c.page_content for c in chunks]
     try:
-        embeddings_list = embeddings.embed_documents(texts)
+        store = await check_index_dimension()
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Embedding failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Upsert failed: {e}")
 
-    try:
-        desc = pc.describe_index(INDEX_NAME)
-        if desc.dimension != 1536:
-            raise HTTPException(status_code=500, detail=f"Pinecone index dim {desc.dimension} != 1536")
+    upsert_queue = asyncio.Queue(maxsize=UPSERT_CONCURRENCY * 2)
+    embed_slots = asyncio.Semaphore(EMBED_CONCURRENCY)
+    embed_tasks = []
+    added = 0
 
-        index = pc.Index(INDEX_NAME)
+    async def embed_batch(batch):
+        texts = [c.page_content for c in batch]
+        try:
+            with metrics.timer("embed_documents"):
+                embeddings_list = await embed_texts(texts, INGESTION)
+        except HTTPException:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Embedding failed: {e}")
+        finally:
+            embed_slots.release()
+        metrics.inc("chunks_embedded_total", len(batch))
+        metrics.inc("embedding_tokens_estimated_total", sum(estimate_tokens(t) for t in texts))
+
+        if job is not None:
+            job.chunks_embedded += len(batch)
 
         vectors = []
-        for c, emb in zip(chunks, embeddings_list):
+        for c, emb in zip(batch, embeddings_list):
             meta = dict(c.metadata or {})
             meta["text"] = c.page_content
             vectors.append({"id": meta["id"], "values": emb, "metadata": meta})
-
         for i in range(0, len(vectors), UPSERT_BATCH):
-            batch = vectors[i:i+UPSERT_BATCH]
-            index.upsert(vectors=batch, namespace="")
+            await upsert_queue.put(vectors[i:i+UPSERT_BATCH])
+
+    async def produce():
+        nonlocal added
+        batches = embedding_batches(chunks)
+        try:
+            async for batch in batches:
+                await embed_slots.acquire()
+                for task in embed_tasks:
+                    if task.done() and task.exception() is not None:
+                        embed_slots.release()
+                        raise task.exception()
+                added += len(batch)
+                embed_tasks.append(asyncio.ensure_future(embed_batch(batch)))
+        finally:
+            await batches.aclose()
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        await asyncio.gather(*embed_tasks)
+        for _ in range(UPSERT_CONCURRENCY):
+            await upsert_queue.put(None)
+
+    async def upsert_worker():
+        while True:
+            batch = await upsert_queue.get()
+            if batch is None:
+                return
+            try:
+                with metrics.timer("upsert"):
+                    await with_backoff(lambda: run_limited(asyncio.to_thread(store.upsert, batch, namespace)))
+            except Exception as e:
+                traceback.print_exc()
+                raise HTTPException(status_code=500, detail=f"Upsert failed: {e}")
+            metrics.inc("chunks_upserted_total", len(batch))
+            if job is not None:
+                job.chunks_upserted += len(batch)
+
+    tasks = [asyncio.ensure_future(produce())] + [
+        asyncio.ensure_future(upsert_worker()) for _ in range(UPSERT_CONCURRENCY)
+    ]
+    try:
+        done, _pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks + embed_tasks:
+            task.cancel()
+
+    if added:
+        print(f"Successfully added {added} documents to the {store.name} index")
+    return added
 
-        print(f"Successfully added {len(vectors)} documents to Pinecone")
+async def delete_from_pinecone(ids: List[str], namespace: str = "") -> None:
+    """Delete vectors by id from a namespace of the vector index"""
+    if not ids:
+        return
+    try:
+        store = await get_vectorstore()
+        for i in range(0, len(ids), DELETE_BATCH):
+            batch = ids[i:i+DELETE_BATCH]
+            await run_limited(asyncio.to_thread(store.delete, batch, namespace))
+        metrics.inc("chunks_deleted_total", len(ids))
+        print(f"Deleted {len(ids)} stale documents from the {store.name} index")
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Upsert failed: {e}")
-
+        raise HTTPException(status_code=500, detail=f"Delete failed: {e}")
+
+def spread_sample(items: List[str], size: int) -> List[str]:
+    """At most `size` items spread evenly over `items`, always including the last"""
+    if len(items) <= size:
+        return list(items)
+    step = (len(items) - 1) / (size - 1) if size > 1 else 0
+    return [items[len(items) - 1 - round(i * step)] for i in range(size)]
+
+async def wait_until_queryable(
+    upserted_ids: List[str], deleted_ids: List[str] = (), namespace: str = "", timeout: float = READY_TIMEOUT
+) -> bool:
+    """
+    Poll the index until a sample of the upserted ids is visible and the
+    sampled deleted ids are gone from `namespace`, instead of sleeping
+    blindly. Vectors outside the sample (e.g. orphans from an earlier
+    failure) do not hold the upload up. Returns False on timeout.
+    """
+    store = await get_vectorstore()
+    present = spread_sample(list(upserted_ids), READY_SAMPLE_IDS)
+    absent = spread_sample(list(deleted_ids), READY_SAMPLE_IDS)
+    if not present and not absent:
+        return True
+    deadline = asyncio.get_running_loop().time() + timeout
+    delay = 0.25
+    while True:
+        found = await run_limited(asyncio.to_thread(store.existing, present + absent, namespace))
+        missing = len([i for i in present if i not in found])
+        lingering = len([i for i in absent if i in found])
+        if not missing and not lingering:
+            return True
+        if asyncio.get_running_loop().time() + delay > deadline:
+            print(
+                f"Namespace {namespace!r}: {missing}/{len(present)} sampled new vectors not visible, "
+                f"{lingering}/{len(absent)} sampled deleted vectors still present; giving up waiting"
+            )
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+def hash_file(file_path: Union[str, bytes]) -> str:
+    if isinstance(file_path, bytes):
+        return hashlib.sha256(file_path).hexdigest()
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 def calculate_chunk_ids(chunks):
     last_page_id = None
@@ -290,35 +793,107 @@ def calculate_chunk_ids(chunks):
 
     return chunks
 
-def clear_database():
-    """Clear all documents from Pinecone index"""
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def _spread_order(n: int) -> List[int]:
+    """Order 0..n-1 so that every prefix is spread evenly across the range (van der Corput)"""
+    seen = set()
+    order = []
+    j = 0
+    while len(order) < n:
+        v, denom, k = 0.0, 1.0, j
+        while k:
+            denom *= 2
+            v += (k & 1) / denom
+            k >>= 1
+        i = int(v * n)
+        if i not in seen:
+            seen.add(i)
+            order.append(i)
+        j += 1
+    return order
+
+def select_context_chunks(docs: List[Document], token_budget: int = GENERATION_CONTEXT_TOKENS) -> List[Document]:
+    """
+    Pick a page-stratified subset of chunks that fits in `token_budget`.
+    Pages are visited in an evenly spread order and take turns contributing
+    one chunk at a time, so small budgets still cover the whole document.
+    The result is returned in document order.
+    """
+    pages = {}
+    for position, doc in enumerate(docs):
+        chunk_id = doc.metadata.get("id")
+        key = parse_chunk_id(chunk_id) if chunk_id else ("", -1, position)
+        pages.setdefault(key[:2], []).append((key[2], doc))
+
+    page_keys = sorted(pages)
+    page_chunks = [sorted(pages[k], key=lambda item: item[0]) for k in page_keys]
+    order = _spread_order(len(page_keys))
+
+    selected = []
+    used = 0
+    depth = 0
+    max_depth = max((len(c) for c in page_chunks), default=0)
+    while depth < max_depth and used < token_budget:
+        for i in order:
+            if depth >= len(page_chunks[i]):
+                continue
+            idx, doc = page_chunks[i][depth]
+            cost = estimate_tokens(doc.page_content)
+            if used + cost > token_budget:
+                continue
+            used += cost
+            selected.append((page_keys[i], idx, doc))
+        depth += 1
+
+    selected.sort(key=lambda item: (item[0], item[1]))
+    return [doc for _key, _idx, doc in selected]
+
+async def get_document_chunks(namespace: str = "") -> List[Document]:
+    """
+    All chunks of the document uploaded to `namespace`. Served from the local
+    chunk store; falls back to scanning the namespace in the vector index when
+    the store is empty (e.g. a fresh instance that did not handle the upload).
+    """
+    docs = await asyncio.to_thread(chunk_store.get_chunks, namespace=namespace)
+    if docs:
+        return docs
+    store = await get_vectorstore()
+    scan_embedding = await embed_query_text("", GENERATION)
+    results = await run_limited(asyncio.to_thread(store.search, scan_embedding, 10000, namespace))
+    return [doc for doc, _score in results]
+
+async def clear_database(namespace: str = ""):
+    """Clear all documents in `namespace` from the vector index; other namespaces are untouched"""
+    await asyncio.to_thread(chunk_store.clear, namespace)
+    keyword_index.clear(namespace)
+    await asyncio.to_thread(item_bank.clear, namespace)
+    query_cache.invalidate(namespace)
     try:
-        if INDEX_NAME not in {i.name for i in pc.list_indexes().indexes}:
-            print("Index does not exist, nothing to clear")
-            return
-        
-        index = pc.Index(INDEX_NAME)
-        index.delete(delete_all=True)
-        print("Successfully cleared Pinecone database")
+        store = await get_vectorstore()
+        await asyncio.to_thread(store.delete_all, namespace)
+        print(f"Successfully cleared namespace {namespace!r} of the {store.name} index")
     except Exception as e:
-        print(f"Error clearing Pinecone database: {e}")
+        print(f"Error clearing vector index: {e}")
         if "404" not in str(e):
             raise e
 
-def query_rag(query_text: str):
-    """Query the RAG system using Pinecone"""
-    if vectorstore is None:
-        raise HTTPException(status_code=500, detail="Vectorstore not initialized")
+async def query_rag(query_text: str):
+    """Query the RAG system using the vector index only"""
+    store = await get_vectorstore()
         
     try:
-        results = vectorstore.similarity_search_with_score(query_text, k=5)
+        query_embedding = await embed_query_text(query_text)
+        results = await run_limited(asyncio.to_thread(store.search, query_embedding, 5))
 
         context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
         prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
         prompt = prompt_template.format(context=context_text, question=query_text)
 
-        model = ChatOpenAI(model="gpt-4o")
-        response_text = model.invoke(prompt)
+        model = get_chat_model()
+        response_text = await invoke_chat(model, prompt, INTERACTIVE)
 
         sources = [doc.metadata.get("id", None) for doc, _score in results]
         formatted_response = f"Response: {response_text}\nSources: {sources}"
@@ -327,228 +902,845 @@ def query_rag(query_text: str):
         print(f"Error querying RAG: {e}")
         raise e
 
-def upload_documents_to_pinecone_from_file(file_path: str) -> int:
-    """Upload a single PDF file to Pinecone database"""
+# Held by an upload for the whole replace of its namespace's document
+_namespace_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def namespace_lock(namespace: str) -> asyncio.Lock:
+    lock = _namespace_locks.get(namespace)
+    if lock is None:
+        lock = _namespace_locks[namespace] = asyncio.Lock()
+    return lock
+
+async def upload_documents_to_pinecone_from_file(
+    file_path: Union[str, bytes],
+    filename: str = None,
+    job: Optional[IngestionJob] = None,
+    namespace: str = "",
+    file_hash: Optional[str] = None,
+) -> Tuple[int, Optional[str]]:
+    """
+    Upload a single PDF file to a Pinecone namespace, replacing the document
+    previously uploaded to that namespace. Only chunks whose text changed are embedded and
+    upserted, and only vectors that disappeared are deleted. Waits until
+    the index serves the new vectors, so the document is queryable.
+    Uploads into the same namespace run one at a time.
+
+    Returns (chunk count, warning); the warning is set (and recorded on
+    `job`) when the index did not confirm the changes within READY_TIMEOUT.
+
+    `file_path` may also be the PDF's bytes; pass `file_hash` when the
+    sha256 was already computed while receiving the file.
+    """
+    def set_stage(stage):
+        if job is not None:
+            job.stage = stage
+
     try:
-        clear_database()
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
+        if file_hash is None:
+            file_hash = await asyncio.to_thread(hash_file, file_path)
+        # Each upload diffs against what the previous one indexed, so uploads
+        # into one namespace must not interleave
+        async with namespace_lock(namespace):
+            set_stage("parsing")
+            if file_hash == await asyncio.to_thread(chunk_store.get_meta, "file_hash", namespace):
+                print("Document unchanged, skipping re-indexing")
+                count = await asyncio.to_thread(chunk_store.count, namespace)
+                if job is not None:
+                    job.chunks_total = count
+                return count, None
+
+            indexed_hashes = await asyncio.to_thread(chunk_store.get_content_hashes, namespace)
+            if not indexed_hashes:
+                # Nothing known locally about what is in the index; start clean
+                await clear_database(namespace)
+
+            # Pages are parsed across a process pool and each page range is split
+            # and fed into the embedding pipeline as soon as it is ready. The source is the
+            # upload's filename so chunk ids survive re-uploads of the same file.
+            chunks = []
+            changed = []
+
+            async def changed_ranges():
+                async for pages in stream_pdf_pages(file_path, source=filename):
+                    page_chunks = calculate_chunk_ids(await asyncio.to_thread(split_documents, pages))
+                    for chunk in page_chunks:
+                        chunk.metadata["content_hash"] = hash_text(chunk.page_content)
+                    page_changed = [
+                        c for c in page_chunks if indexed_hashes.get(c.metadata["id"]) != c.metadata["content_hash"]
+                    ]
+                    chunks.extend(page_chunks)
+                    changed.extend(page_changed)
+                    if job is not None:
+                        job.chunks_total = len(changed)
+                    if page_changed:
+                        set_stage("embedding")
+                        yield page_changed
+
+            await add_to_pinecone(changed_ranges(), job=job, namespace=namespace)
+
+            current_ids = {c.metadata["id"] for c in chunks}
+            stale_ids = [i for i in indexed_hashes if i not in current_ids]
+            print(f"Re-indexed {len(changed)} changed chunks, deleting {len(stale_ids)} stale chunks")
+
+            await delete_from_pinecone(stale_ids, namespace)
+            warning = None
+            if changed or stale_ids:
+                set_stage("verifying")
+                if not await wait_until_queryable([c.metadata["id"] for c in changed], stale_ids, namespace):
+                    warning = (
+                        f"The index did not confirm the new content within {READY_TIMEOUT:g}s; "
+                        "answers may miss parts of the document for a little while"
+                    )
+                    if job is not None:
+                        job.warning = warning
+            await asyncio.to_thread(chunk_store.delete_chunks, stale_ids, namespace)
+            await asyncio.to_thread(chunk_store.add_chunks, changed, namespace)
+            await asyncio.to_thread(chunk_store.set_meta, "file_hash", file_hash, namespace)
+            await asyncio.to_thread(keyword_index.remove, stale_ids, namespace)
+            await asyncio.to_thread(keyword_index.add, changed, namespace)
+            if changed or stale_ids:
+                await asyncio.to_thread(
+                    item_bank.discard_derived_from, namespace, [c.metadata["id"] for c in changed] + stale_ids
+                )
+                query_cache.invalidate(namespace)
+            schedule_item_bank(namespace, filename)
         
-        chunks = split_documents(documents)
-        
-        add_to_pinecone(chunks)
-        
-        return len(chunks)
+            return len(chunks), warning
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error Processing PDF: {str(e)}")
 
-def query_rag_from_pinecone(query_text: str) -> dict:
-    """Query the RAG system and return response with sources"""
-    if vectorstore is None:
-        raise HTTPException(status_code=500, detail="Vectorstore not initialized")
-        
-    try:
-        results = vectorstore.similarity_search_with_score(query_text, k=5)
+async def hybrid_search(query_text: str, query_embedding: List[float], namespace: str = "", k: int = RERANK_CANDIDATES):
+    """
+    Run the vector index search and the local BM25 keyword search
+    concurrently and merge them with reciprocal rank fusion, so exact terms
+    (formulas, names, acronyms) are found even when embeddings miss them.
+    Returns (fused top `k`, {chunk id: vector similarity}).
+    """
+    store = await get_vectorstore()
 
-        context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-        prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-        prompt = prompt_template.format(context=context_text, question=query_text)
+    async def vector_search():
+        with metrics.timer("vector_search"):
+            return await run_limited(asyncio.to_thread(store.search, query_embedding, HYBRID_CANDIDATES, namespace))
 
-        model = ChatOpenAI(model="gpt-4o")
-        response_text = model.invoke(prompt)
+    async def keyword_search():
+        with metrics.timer("keyword_search"):
+            return await asyncio.to_thread(keyword_index.search, query_text, HYBRID_CANDIDATES, namespace)
 
-        sources = [doc.metadata.get("id", None) for doc, _score in results]
-        
-        return {
-            "response": str(response_text),
-            "sources": sources
-        }
+    vector_results, keyword_results = await asyncio.gather(vector_search(), keyword_search())
+    return fuse_results(vector_results, keyword_results, k)
+
+def fuse_results(vector_results, keyword_results, k: int = RERANK_CANDIDATES):
+    """Returns (fused top `k`, {chunk id: vector similarity})"""
+    vector_scores = {doc.metadata.get("id"): score for doc, score in vector_results}
+    return reciprocal_rank_fusion([vector_results, keyword_results], k=k, rrf_k=RRF_K), vector_scores
+
+async def retrieve_query_context(query_text: str, namespace: str = ""):
+    """
+    Embed the query once and either return a cached answer or the packed
+    context retrieved from `namespace` by hybrid search. Returns
+    (cached_result, query_embedding, packed_context, cache_version).
+    """
+    cache_version = query_cache.version(namespace)
+    cached = query_cache.get_exact(query_text, namespace)
+    if cached is not None:
+        return cached, None, None, cache_version
+
+    with metrics.timer("embed_query"):
+        query_embedding = await embed_query_text(query_text)
+
+    cached = query_cache.get_semantic(query_embedding, namespace)
+    if cached is not None:
+        return cached, query_embedding, None, cache_version
+
+    candidates, vector_scores = await hybrid_search(query_text, query_embedding, namespace)
+    return None, query_embedding, pack_query_context(query_text, candidates, vector_scores), cache_version
+
+def tokens_saved(packed: dict) -> int:
+    """
+    Tokens packing saved against the unpacked top chunks. Never negative:
+    reranking can pick longer chunks than the vector top-k it replaces.
+    """
+    return max(0, packed["baseline_tokens"] - packed["context_tokens"])
+
+def pack_query_context(query_text: str, candidates, vector_scores: dict) -> dict:
+    """Rerank and pack hybrid search candidates into the /query context"""
+    with metrics.timer("context_packing"):
+        packed = pack_context(
+            query_text,
+            [doc for doc, _score in candidates],
+            vector_scores,
+            token_budget=QUERY_CONTEXT_TOKENS,
+            max_chunks=RETRIEVAL_K,
+            lexical_weight=RERANK_LEXICAL_WEIGHT,
+        )
+    saved = tokens_saved(packed)
+    metrics.inc("query_context_tokens_total", packed["context_tokens"])
+    metrics.inc("query_context_tokens_saved_total", saved)
+    print(f"Query context: {packed['context_tokens']} tokens ({saved} saved by packing)")
+    return packed
+
+def build_query_prompt(query_text: str, packed: dict) -> str:
+    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+    return prompt_template.format(context=packed["context"], question=query_text)
+
+def record_llm_usage(message, purpose: str) -> None:
+    """Count the prompt and completion tokens the provider reported for a chat call"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    for kind in ("input", "output"):
+        if usage.get(f"{kind}_tokens"):
+            metrics.inc("llm_tokens_total", usage[f"{kind}_tokens"], type=kind, purpose=purpose)
+
+def context_usage(packed: dict) -> dict:
+    return {
+        "context_tokens": packed["context_tokens"],
+        "context_tokens_saved": tokens_saved(packed),
+    }
+
+async def answer_query(query_text: str, packed: dict, priority: int = INTERACTIVE) -> dict:
+    """Generate the answer for a packed context; returns the /query result"""
+    prompt = build_query_prompt(query_text, packed)
+
+    model = get_chat_model()
+    with metrics.timer("llm", purpose="query"):
+        response_text = await invoke_chat(model, prompt, priority)
+    record_llm_usage(response_text, "query")
+
+    return {
+        "response": response_text.content,
+        "sources": packed["sources"],
+        **context_usage(packed)
+    }
+
+async def query_rag_from_pinecone(query_text: str, namespace: str = "") -> dict:
+    """Query the RAG system and return response with sources"""
+    try:
+        cached, query_embedding, packed, cache_version = await retrieve_query_context(query_text, namespace)
+        if cached is not None:
+            return cached
+
+        result = await answer_query(query_text, packed)
+        query_cache.put(query_text, query_embedding, result, version=cache_version, namespace=namespace)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying RAG: {str(e)}")
 
-def generate_flashcards_from_rag(num_flashcards: int = 5, difficulty: str = "medium") -> dict:
-    """Generate flashcards for the uploaded documents using RAG system"""
-    if vectorstore is None:
-        raise HTTPException(status_code=500, detail="Vectorstore not initialized")
-        
-    try:
-        results = vectorstore.similarity_search_with_score("", k=10000)
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        if not results:
-            raise HTTPException(status_code=404, detail=f"No relevant content found")
+async def stream_query_rag_from_pinecone(query_text: str, namespace: str = "") -> AsyncIterator[str]:
+    """
+    Server-Sent Events for a query: a `sources` event with the retrieved
+    chunk ids, `token` events as the answer is generated, then `done` with
+    the context token usage.
+    """
+    try:
+        cached, query_embedding, packed, cache_version = await retrieve_query_context(query_text, namespace)
+        if cached is not None:
+            yield sse_event("sources", cached["sources"])
+            yield sse_event("token", {"text": cached["response"]})
+            yield sse_event("done", {"cached": True})
+            return
 
-        context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-        
-        prompt_template = ChatPromptTemplate.from_template(FLASHCARD_PROMPT_TEMPLATE)
-        prompt = prompt_template.format(
-            context=context_text, 
-            num_flashcards=num_flashcards,
-            difficulty=difficulty
+        sources = packed["sources"]
+        yield sse_event("sources", sources)
+
+        prompt = build_query_prompt(query_text, packed)
+        model = get_chat_model()
+        message = None
+        started = time.perf_counter()
+        async with aclosing(stream_chat(model, prompt, INTERACTIVE)) as chunks:
+            async for chunk in chunks:
+                if message is None:
+                    metrics.observe("llm_first_token_seconds", time.perf_counter() - started, purpose="query")
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    yield sse_event("token", {"text": chunk.content})
+        metrics.record_stage("llm", time.perf_counter() - started, purpose="query")
+        record_llm_usage(message, "query")
+
+        usage = context_usage(packed)
+        response_text = message.content if message is not None else ""
+        query_cache.put(
+            query_text, query_embedding, {"response": response_text, "sources": sources, **usage},
+            version=cache_version, namespace=namespace
         )
+        yield sse_event("done", {"cached": False, **usage})
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail})
+    except Exception as e:
+        traceback.print_exc()
+        yield sse_event("error", {"detail": f"Error querying RAG: {str(e)}"})
 
-        model = ChatOpenAI(model="gpt-4o", temperature=0.7)
-        response_text = model.invoke(prompt)
-        
-        try:
-            flashcards_data = json.loads(str(response_text).strip())
-            if not isinstance(flashcards_data, list):
-                raise ValueError("Response is not a list")
-        except (json.JSONDecodeError, ValueError) as e:
-            response_str = str(response_text)
-            start_idx = response_str.find('[')
-            end_idx = response_str.rfind(']') + 1
-            if start_idx != -1 and end_idx != 0:
-                try:
-                    fixed_str = response_str[start_idx:end_idx].encode('utf-8').decode('unicode_escape')
-                    flashcards_data = json.loads(fixed_str)
-                except json.JSONDecodeError:
-                    raise HTTPException(status_code=500, detail="Failed to parse flashcards from AI response")
-            else:
-                return {
-                    "flashcards": [],
-                    "sources": []
-                }
-
-        flashcards = []
-        for item in flashcards_data[:num_flashcards]:
-            if isinstance(item, dict) and "question" in item and "answer" in item:
-                flashcards.append(Flashcard(
-                    question=item["question"],
-                    answer=item["answer"],
-                    difficulty=difficulty
-                ))
+async def batch_hybrid_search(query_texts: List[str], query_embeddings: List[List[float]], namespace: str = ""):
+    """
+    hybrid_search for many queries at once: the local index answers all
+    vector queries with one matrix product, Pinecone gets concurrent
+    queries. Returns one (fused candidates, vector scores) pair per query.
+    """
+    store = await get_vectorstore()
+
+    async def vector_search():
+        with metrics.timer("vector_search"):
+            if isinstance(store, LocalVectorBackend):
+                return await asyncio.to_thread(store.search_many, query_embeddings, HYBRID_CANDIDATES, namespace)
+            return await asyncio.gather(*(
+                run_limited(asyncio.to_thread(store.search, embedding, HYBRID_CANDIDATES, namespace))
+                for embedding in query_embeddings
+            ))
+
+    async def keyword_search():
+        with metrics.timer("keyword_search"):
+            return await asyncio.to_thread(
+                lambda: [keyword_index.search(q, HYBRID_CANDIDATES, namespace) for q in query_texts]
+            )
+
+    vector_results, keyword_results = await asyncio.gather(vector_search(), keyword_search())
+    return [fuse_results(v, kw) for v, kw in zip(vector_results, keyword_results)]
+
+async def stream_query_batch(questions: List[str], namespace: str = "") -> AsyncIterator[str]:
+    """
+    Server-Sent Events answering many questions with shared work: repeated
+    questions are answered once, all uncached questions are embedded in a
+    single request and searched together, chunks retrieved for several
+    questions are shared, and up to QUERY_BATCH_CONCURRENCY answers are
+    generated at a time. Emits a `result` event (with the question's
+    `index`) as each answer finishes, `error` events for questions that
+    failed, then `done` with batch statistics.
+    """
+    positions = {}
+    for i, question in enumerate(questions):
+        positions.setdefault(question, []).append(i)
+    stats = {"questions": len(questions), "unique_questions": len(positions), "cached": 0, "failed": 0}
 
-        sources = [doc.metadata.get("id", None) for doc, _score in results]
+    def results(question: str, result: dict, cached: bool):
+        for i in positions[question]:
+            yield sse_event("result", {"index": i, "question": question, "cached": cached, **result})
+
+    def errors(question: str, detail: str):
+        stats["failed"] += len(positions[question])
+        for i in positions[question]:
+            yield sse_event("error", {"index": i, "question": question, "detail": detail})
+
+    tasks = []
+    try:
+        cache_version = query_cache.version(namespace)
+        pending = []
+        for question in positions:
+            cached = query_cache.get_exact(question, namespace)
+            if cached is None:
+                pending.append(question)
+                continue
+            stats["cached"] += len(positions[question])
+            for event in results(question, cached, True):
+                yield event
+
+        if pending:
+            with metrics.timer("embed_query"):
+                query_embeddings = await embed_texts(pending, GENERATION)
+            embedding_of = dict(zip(pending, query_embeddings))
+            uncached = []
+            for question in pending:
+                cached = query_cache.get_semantic(embedding_of[question], namespace)
+                if cached is None:
+                    uncached.append(question)
+                    continue
+                stats["cached"] += len(positions[question])
+                for event in results(question, cached, True):
+                    yield event
+
+            searches = await batch_hybrid_search(uncached, [embedding_of[q] for q in uncached], namespace) if uncached else []
+            packed_of = {}
+            shared = {}
+            for question, (candidates, vector_scores) in zip(uncached, searches):
+                # One Document per chunk across the batch
+                candidates = [(shared.setdefault(doc.metadata.get("id"), doc), score) for doc, score in candidates]
+                packed_of[question] = pack_query_context(question, candidates, vector_scores)
+            context_chunks = [chunk_id for packed in packed_of.values() for chunk_id in packed["sources"]]
+            stats["context_chunks"] = len(context_chunks)
+            stats["unique_context_chunks"] = len(set(context_chunks))
+
+            slots = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+
+            async def answer(question: str):
+                async with slots:
+                    try:
+                        return question, await answer_query(question, packed_of[question], GENERATION), None
+                    except Exception as e:
+                        traceback.print_exc()
+                        return question, None, f"Error querying RAG: {str(e)}"
+
+            tasks = [asyncio.ensure_future(answer(q)) for q in uncached]
+            for next_done in asyncio.as_completed(tasks):
+                question, result, error = await next_done
+                if error is not None:
+                    for event in errors(question, error):
+                        yield event
+                    continue
+                query_cache.put(
+                    question, embedding_of[question], result, version=cache_version, namespace=namespace
+                )
+                for event in results(question, result, False):
+                    yield event
+
+        yield sse_event("done", stats)
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail})
+    except Exception as e:
+        traceback.print_exc()
+        yield sse_event("error", {"detail": f"Error querying RAG: {str(e)}"})
+    finally:
+        # Client went away: stop generating answers nobody will read
+        for task in tasks:
+            task.cancel()
+
+def parse_flashcard(item: dict, difficulty: str) -> Optional[Flashcard]:
+    """Validate one generated flashcard; returns None if it is unusable"""
+    question = item.get("question")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
+        return None
+    return Flashcard(question=question, answer=answer, difficulty=difficulty)
+
+def parse_quiz_question(item: dict, difficulty: str) -> Optional[QuizQuestion]:
+    """Validate one generated quiz question; returns None if it is unusable"""
+    question = item.get("question")
+    options = item.get("options")
+    correct_answer = item.get("correct_answer")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    # Exactly 4 distinct string options, one of which is the correct answer
+    if not isinstance(options, list) or len(options) != 4 or len(set(map(str, options))) != 4:
+        return None
+    if not all(isinstance(o, str) for o in options) or correct_answer not in options:
+        return None
+    return QuizQuestion(question=question, options=options, correct_answer=correct_answer, difficulty=difficulty)
+
+async def get_generation_context(namespace: str = ""):
+    """Returns (context_docs, context_text) for flashcard/quiz prompts"""
+    results = await get_document_chunks(namespace)
+
+    if not results:
+        raise HTTPException(status_code=404, detail="No relevant content found")
+
+    # Combine a bounded, page-stratified sample of the document
+    context_docs = select_context_chunks(results)
+    context_text = "\n\n---\n\n".join([doc.page_content for doc in context_docs])
+    return context_docs, context_text
+
+async def stream_generated_items(
+    template: str,
+    count_field: str,
+    count: int,
+    difficulty: str,
+    context_text: str,
+    parse_item,
+    priority: int = GENERATION,
+) -> AsyncIterator:
+    """
+    Stream the model's JSON array and yield each element as soon as it is
+    complete and passes `parse_item`. Invalid or duplicate elements are
+    dropped, and only the missing count is re-requested, for up to
+    GENERATION_ROUNDS calls.
+    """
+    seen = set()
+    produced = 0
+    prompt_template = ChatPromptTemplate.from_template(template)
+    for _round in range(GENERATION_ROUNDS):
+        missing = count - produced
+        if missing <= 0:
+            return
+        if produced:
+            print(f"Got {produced}/{count} valid items, requesting {missing} more")
+
+        prompt = prompt_template.format(context=context_text, difficulty=difficulty, **{count_field: missing})
+        model = get_chat_model(temperature=0.7)
+        parser = JsonArrayStreamParser()
+        message = None
+        parse_seconds = 0.0
+        started = time.perf_counter()
+        async with aclosing(stream_chat(model, prompt, priority)) as chunks:
+            async for chunk in chunks:
+                if message is None:
+                    metrics.observe("llm_first_token_seconds", time.perf_counter() - started, purpose="generation")
+                message = chunk if message is None else message + chunk
+                parse_started = time.perf_counter()
+                items = parser.feed(chunk.content)
+                parse_seconds += time.perf_counter() - parse_started
+                for item in items:
+                    parsed = parse_item(item, difficulty) if isinstance(item, dict) else None
+                    if parsed is None or parsed.question in seen:
+                        continue
+                    seen.add(parsed.question)
+                    produced += 1
+                    metrics.inc("generated_items_total")
+                    yield parsed
+                    if produced >= count:
+                        break
+                if produced >= count:
+                    break
+        metrics.record_stage("llm", time.perf_counter() - started, purpose="generation")
+        metrics.record_stage("json_parse", parse_seconds)
+        record_llm_usage(message, "generation")
+
+async def generate_flashcards_from_rag(num_flashcards: int = 5, difficulty: str = "medium", namespace: str = "") -> dict:
+    """Generate flashcards for the uploaded documents using RAG system"""
+    try:
+        context_docs, context_text = await get_generation_context(namespace)
+
+        flashcards = [
+            card async for card in stream_generated_items(
+                FLASHCARD_PROMPT_TEMPLATE, "num_flashcards", num_flashcards, difficulty, context_text, parse_flashcard
+            )
+        ]
+
+        sources = [doc.metadata.get("id", None) for doc in context_docs]
         
         return {
             "flashcards": flashcards,
             "sources": sources
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating flashcards: {str(e)}")
 
-def generate_quiz_from_rag(num_questions: int = 8, difficulty: str = "medium") -> dict:
+def partition_by_page(docs: List[Document], num_sections: int) -> List[List[Document]]:
+    """Split chunks into at most `num_sections` contiguous page ranges with roughly equal chunk counts"""
+    docs = sorted(docs, key=lambda d: parse_chunk_id(d.metadata["id"]) if d.metadata.get("id") else ("", -1, 0))
+    pages = [list(group) for _key, group in itertools.groupby(
+        docs, key=lambda d: (d.metadata.get("source"), d.metadata.get("page"))
+    )]
+    target = len(docs) / max(num_sections, 1)
+    sections = []
+    current = []
+    for page_docs in pages:
+        current.extend(page_docs)
+        if len(current) >= target and len(sections) < num_sections - 1:
+            sections.append(current)
+            current = []
+    if current:
+        sections.append(current)
+    return sections
+
+async def dedupe_questions(questions: List[QuizQuestion], threshold: float = QUESTION_DEDUP_THRESHOLD) -> List[QuizQuestion]:
+    """Drop questions whose embedding is within `threshold` cosine similarity of an earlier one"""
+    if len(questions) < 2:
+        return questions
+    vectors = np.asarray(await embed_texts([q.question for q in questions], GENERATION), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    kept = []
+    for i in range(len(questions)):
+        if not kept or float(np.max(vectors[kept] @ vectors[i])) < threshold:
+            kept.append(i)
+    return [questions[i] for i in kept]
+
+async def generate_quiz_fan_out(num_questions: int, difficulty: str, namespace: str = "") -> dict:
+    """
+    Partition the document into page sections, generate questions for every
+    section concurrently from smaller prompts, then interleave, drop
+    near-duplicates and trim to `num_questions`.
+    """
+    results = await get_document_chunks(namespace)
+
+    if not results:
+        raise HTTPException(status_code=404, detail="No relevant content found")
+
+    sections = partition_by_page(results, min(QUIZ_SECTIONS, num_questions))
+    # Over-ask slightly so deduplication still leaves enough questions
+    per_section = math.ceil(num_questions / len(sections)) + 1
+    section_budget = max(GENERATION_CONTEXT_TOKENS // len(sections), 1000)
+    section_contexts = [select_context_chunks(section, section_budget) for section in sections]
+
+    async def generate_section(context_docs):
+        context_text = "\n\n---\n\n".join([doc.page_content for doc in context_docs])
+        return [
+            question async for question in stream_generated_items(
+                QUIZ_PROMPT_TEMPLATE, "num_questions", per_section, difficulty, context_text, parse_quiz_question
+            )
+        ]
+
+    section_questions = await asyncio.gather(*(generate_section(c) for c in section_contexts))
+    merged = [q for group in itertools.zip_longest(*section_questions) for q in group if q is not None]
+    questions = (await dedupe_questions(merged))[:num_questions]
+
+    sources = [doc.metadata.get("id", None) for context_docs in section_contexts for doc in context_docs]
+    return {
+        "questions": questions,
+        "sources": sources
+    }
+
+async def generate_quiz_from_rag(
+    num_questions: int = 8, difficulty: str = "medium", parallel: bool = False, namespace: str = ""
+) -> dict:
     """Generate quiz questions from uploaded documents using RAG system"""
-    if vectorstore is None:
-        raise HTTPException(status_code=500, detail="Vectorstore not initialized")
-        
     try:
-        # Get relevant documents from the vector store
-        results = vectorstore.similarity_search_with_score("", k=10000)
+        if parallel:
+            return await generate_quiz_fan_out(num_questions, difficulty, namespace)
 
-        if not results:
-            raise HTTPException(status_code=404, detail="No relevant content found")
+        # Get a bounded sample of the document's chunks from the local chunk store
+        context_docs, context_text = await get_generation_context(namespace)
 
-        # Combine context from multiple documents
-        context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-        
-        # Create prompt for quiz generation
-        prompt_template = ChatPromptTemplate.from_template(QUIZ_PROMPT_TEMPLATE)
-        prompt = prompt_template.format(
-            context=context_text, 
-            num_questions=num_questions,
-            difficulty=difficulty
-        )
-
-        # Generate quiz using OpenAI
-        model = ChatOpenAI(model="gpt-4o", temperature=0.7)
-        response_text = model.invoke(prompt)
-        
-        # Parse the JSON response
-        try:
-            quiz_data = json.loads(str(response_text).strip())
-            if not isinstance(quiz_data, list):
-                raise ValueError("Response is not a list")
-        except (json.JSONDecodeError, ValueError) as e:
-            # Try to extract JSON from response if it's wrapped in other text
-            response_str = str(response_text)
-            start_idx = response_str.find('[')
-            end_idx = response_str.rfind(']') + 1
-            if start_idx != -1 and end_idx != 0:
-                try:
-                    fixed_str = response_str[start_idx:end_idx].encode('utf-8').decode('unicode_escape')
-                    quiz_data = json.loads(fixed_str)
-                except json.JSONDecodeError:
-                    raise HTTPException(status_code=500, detail="Failed to parse quiz questions from AI response")
-            else:
-                return {
-                    "questions": [],
-                    "sources": []
-                }
-
-        # Create QuizQuestion objects
-        questions = []
-        for item in quiz_data[:num_questions]:
-            if isinstance(item, dict) and "question" in item and "options" in item and "correct_answer" in item:
-                # Validate that we have exactly 4 options
-                if len(item["options"]) != 4:
-                    continue
-                    
-                # Validate that correct_answer is one of the options
-                if item["correct_answer"] not in item["options"]:
-                    continue
-                    
-                questions.append(QuizQuestion(
-                    question=item["question"],
-                    options=item["options"],
-                    correct_answer=item["correct_answer"],
-                    difficulty=difficulty
-                ))
+        # Generate and validate questions one by one as the model emits them
+        questions = [
+            question async for question in stream_generated_items(
+                QUIZ_PROMPT_TEMPLATE, "num_questions", num_questions, difficulty, context_text, parse_quiz_question
+            )
+        ]
 
         # Get source information
-        sources = [doc.metadata.get("id", None) for doc, _score in results]
+        sources = [doc.metadata.get("id", None) for doc in context_docs]
         
         return {
             "questions": questions,
             "sources": sources
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
+BANK_KINDS = {
+    "flashcard": (FLASHCARD_PROMPT_TEMPLATE, "num_flashcards", parse_flashcard),
+    "question": (QUIZ_PROMPT_TEMPLATE, "num_questions", parse_quiz_question),
+}
+
+async def build_item_bank(namespace: str, job: Optional[IngestionJob] = None) -> int:
+    """
+    Top the namespace's bank up to BANK_ITEMS_PER_DIFFICULTY flashcards and
+    quiz questions per difficulty. Items are generated per page section, as
+    in the parallel quiz, and tagged with the ids of that section's context
+    chunks. Returns the number of items added.
+    """
+    version = document_version(namespace)
+    docs = await get_document_chunks(namespace)
+    if not docs:
+        return 0
+    if job is not None:
+        job.stage = "generating"
+    sections = partition_by_page(docs, QUIZ_SECTIONS)
+    section_budget = max(GENERATION_CONTEXT_TOKENS // len(sections), 1000)
+    section_contexts = [select_context_chunks(section, section_budget) for section in sections]
+
+    async def generate_section(kind, difficulty, count, context_docs):
+        template, count_field, parse_item = BANK_KINDS[kind]
+        context_text = "\n\n---\n\n".join([doc.page_content for doc in context_docs])
+        items = [
+            item.model_dump() async for item in stream_generated_items(
+                template, count_field, count, difficulty, context_text, parse_item, priority=INGESTION
+            )
+        ]
+        if document_version(namespace) != version:
+            return 0  # the document was replaced meanwhile
+        sources = [doc.metadata.get("id") for doc in context_docs]
+        return await asyncio.to_thread(item_bank.add, namespace, kind, difficulty, items, sources)
+
+    async def fill(kind, difficulty):
+        missing = BANK_ITEMS_PER_DIFFICULTY - await asyncio.to_thread(item_bank.count, namespace, kind, difficulty)
+        if missing <= 0:
+            return 0
+        per_section = math.ceil(missing / len(section_contexts))
+        added = await asyncio.gather(*(
+            generate_section(kind, difficulty, per_section, context_docs) for context_docs in section_contexts
+        ))
+        return sum(added)
+
+    added = sum(await asyncio.gather(*(fill(kind, d) for kind in BANK_KINDS for d in DIFFICULTIES)))
+    print(f"Added {added} items to the generation bank of namespace {namespace!r}")
+    return added
+
+def schedule_item_bank(namespace: str, filename: str = "") -> Optional[IngestionJob]:
+    """Start a background bank build for `namespace` unless one is already running for its current document"""
+    if BANK_ITEMS_PER_DIFFICULTY <= 0:
+        return None
+    version = document_version(namespace)
+    running = _bank_builds.get(namespace)
+    if running is not None and running[0] == version and running[1].finished_at is None:
+        return running[1]
+    job = bank_jobs.submit(filename, lambda job: build_item_bank(namespace, job), namespace=namespace)
+    _bank_builds[namespace] = (version, job)
+    return job
+
+async def draw_from_bank(namespace: str, kind: str, difficulty: str, count: int) -> Optional[dict]:
+    """Random pre-generated items, or None when the bank cannot cover `count` (callers then generate live)"""
+    if BANK_ITEMS_PER_DIFFICULTY <= 0:
+        return None
+
+    def draw():
+        drawn = item_bank.draw(namespace, kind, difficulty, count)
+        return drawn, item_bank.count(namespace, kind, difficulty)
+
+    drawn, remaining = await asyncio.to_thread(draw)
+    if drawn is None or remaining < count:
+        schedule_item_bank(namespace)
+    if drawn is None:
+        return None
+    _template, _count_field, parse_item = BANK_KINDS[kind]
+    return {"items": [parse_item(item, difficulty) for item in drawn["items"]], "sources": drawn["sources"]}
+
+async def stream_generation(
+    template: str, count_field: str, count: int, difficulty: str, parse_item, event: str, namespace: str = ""
+) -> AsyncIterator[str]:
+    """Server-Sent Events for flashcard/quiz generation: `sources`, one `event` per item, then `done`"""
+    try:
+        drawn = await draw_from_bank(namespace, event, difficulty, count)
+        if drawn is not None:
+            yield sse_event("sources", drawn["sources"])
+            for item in drawn["items"]:
+                yield sse_event(event, item.model_dump())
+            yield sse_event("done", {"count": len(drawn["items"]), "bank": True})
+            return
+
+        context_docs, context_text = await get_generation_context(namespace)
+        yield sse_event("sources", [doc.metadata.get("id", None) for doc in context_docs])
+
+        produced = 0
+        async for item in stream_generated_items(template, count_field, count, difficulty, context_text, parse_item):
+            produced += 1
+            yield sse_event(event, item.model_dump())
+        yield sse_event("done", {"count": produced})
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail})
+    except Exception as e:
+        traceback.print_exc()
+        yield sse_event("error", {"detail": f"Error generating {event}s: {str(e)}"})
+
+def validate_flashcard_request(request: FlashcardRequest) -> None:
+    if request.num_flashcards < 1 or request.num_flashcards > 5:
+        raise HTTPException(status_code=400, detail="Number of flashcards must be between 1 and 5")
+    
+    if request.difficulty not in ["easy", "medium", "hard"]:
+        raise HTTPException(status_code=400, detail="Difficulty must be 'easy', 'medium', or 'hard'")
+
+def validate_quiz_request(request: QuizRequest) -> None:
+    if request.num_questions < 1 or request.num_questions > 8:
+        raise HTTPException(status_code=400, detail="Number of questions must be between 1 and 8")
+    
+    if request.difficulty not in ["easy", "medium", "hard"]:
+        raise HTTPException(status_code=400, detail="Difficulty must be 'easy', 'medium', or 'hard'")
+
+USER_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Shared with the web app (web/lib/auth.ts), which signs the session tokens it forwards
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_ALGORITHMS = [name.strip() for name in os.getenv("JWT_ALGORITHMS", "HS256").split(",")]
+# Read-only namespace for requests without a signed-in user (seeded with ingest.py)
+SHARED_NAMESPACE = os.getenv("SHARED_NAMESPACE", "library")
+
+def get_user_id(authorization: Optional[str] = Header(default=None)) -> Optional[str]:
+    """
+    User id from the `Authorization: Bearer <token>` header, verified
+    against JWT_SECRET. None when the header is absent; 401 when it is
+    present but invalid or expired.
+    """
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected a Bearer token", headers={"WWW-Authenticate": "Bearer"})
+    if not JWT_SECRET:
+        raise HTTPException(status_code=503, detail="JWT_SECRET is not configured")
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=JWT_ALGORITHMS, options={"require": ["exp"]})
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    user_id = payload.get("userId")
+    if not isinstance(user_id, str) or not USER_ID_PATTERN.fullmatch(user_id):
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+def get_namespace(user_id: Optional[str] = Depends(get_user_id)) -> str:
+    """
+    Pinecone namespace to query: the signed-in user's own, or the shared
+    library for anonymous requests.
+    """
+    return f"user-{user_id}" if user_id is not None else SHARED_NAMESPACE
+
+def get_user_namespace(user_id: Optional[str] = Depends(get_user_id)) -> str:
+    """
+    Namespace for uploads, job status and flashcard/quiz generation, which
+    always work on a user's own document (the shared library spans many).
+    """
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Sign in required", headers={"WWW-Authenticate": "Bearer"})
+    return f"user-{user_id}"
+
 # API Endpoints
 @app.post("/upload-documents", response_model=UploadResponse)
-async def upload_documents_to_pinecone(file: UploadFile = File(...)):
+async def upload_documents_to_pinecone(
+    file: UploadFile = File(...), background: bool = False, namespace: str = Depends(get_user_namespace)
+):
     """
     Upload a PDF file to the Pinecone database.
-    The file will be processed, split into chunks, and added to the vector store.
+    The file will be processed, split into chunks, and added to the vector store,
+    replacing only the signed-in caller's previous document.
+
+    With `background=true` the request returns immediately with a `job_id`;
+    poll `/jobs/{job_id}` for progress.
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
-    
-    tmp_file_path = None
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+
+    buffer = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir="/tmp") as tmp_file:
-            tmp_file_path = tmp_file.name
-            while True:
-                chunk = await file.read(1024 * 1024)  # 1 MB
-                if not chunk:
-                    break
-                tmp_file.write(chunk)
-            tmp_file.flush()
-            os.fsync(tmp_file.fileno())
+        # Hashed while copied; small files stay in memory and are parsed from there
+        with metrics.timer("receive_upload"):
+            buffer = await receive_upload(file, MAX_UPLOAD_BYTES, UPLOAD_SPOOL_BYTES, dir="/tmp")
 
-        documents_processed = upload_documents_to_pinecone_from_file(tmp_file_path)
+        if background:
+            job_buffer = buffer
+            buffer = None  # owned by the job from here on
 
-        await asyncio.sleep(5)
+            async def run_job(job):
+                try:
+                    await upload_documents_to_pinecone_from_file(
+                        job_buffer.source, job.filename, job=job, namespace=namespace, file_hash=job_buffer.sha256
+                    )
+                finally:
+                    job_buffer.discard()
+
+            job = ingestion_jobs.submit(file.filename, run_job, namespace=namespace)
+            return UploadResponse(
+                message=f"Started processing {file.filename}",
+                documents_processed=0,
+                job_id=job.job_id
+            )
+
+        documents_processed, warning = await upload_documents_to_pinecone_from_file(
+            buffer.source, file.filename, namespace=namespace, file_hash=buffer.sha256
+        )
 
         return UploadResponse(
             message=f"Successfully uploaded and processed {file.filename}",
-            documents_processed=documents_processed
+            documents_processed=documents_processed,
+            warning=warning
         )
 
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=400, detail=f"Error Processing PDF: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error Processing PDF: {e}")
     finally:
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-            except Exception:
-                pass
+        if buffer is not None:
+            buffer.discard()
+
+@app.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_job(job_id: str, namespace: str = Depends(get_user_namespace)):
+    """
+    Report the progress of a background upload: stage, chunk counts and any error.
+    """
+    job = ingestion_jobs.get(job_id)
+    if job is None or job.namespace != namespace:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.post("/query", response_model=QueryResponse)
-async def query_rag_from_pinecone_api(query: str):
+async def query_rag_from_pinecone_api(query: str, namespace: str = Depends(get_namespace)):
     """
     Query the RAG system with a text query.
     Returns the AI response along with source document IDs.
@@ -556,14 +1748,51 @@ async def query_rag_from_pinecone_api(query: str):
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
     
-    result = query_rag_from_pinecone(query)
+    result = await query_rag_from_pinecone(query, namespace)
     return QueryResponse(
         response=result["response"],
-        sources=result["sources"]
+        sources=result["sources"],
+        context_tokens=result.get("context_tokens"),
+        context_tokens_saved=result.get("context_tokens_saved")
+    )
+
+@app.post("/query/stream")
+async def stream_query_rag_from_pinecone_api(query: str, namespace: str = Depends(get_namespace)):
+    """
+    Streaming variant of /query using Server-Sent Events.
+    Emits the source document IDs first, then answer tokens as they are generated.
+    """
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    return StreamingResponse(
+        stream_query_rag_from_pinecone(query, namespace),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_batch_api(request: QueryBatchRequest, namespace: str = Depends(get_namespace)):
+    """
+    Answer up to QUERY_BATCH_MAX questions in one call, sharing embedding
+    and retrieval work. Server-Sent Events: one `result` per question as it
+    finishes (not in request order; use its `index`), then `done`.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions cannot be empty")
+    if len(request.questions) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} questions per batch")
+    if any(not q.strip() for q in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+
+    return StreamingResponse(
+        stream_query_batch(request.questions, namespace),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @app.post("/generate-flashcards", response_model=FlashcardResponse)
-async def generate_flashcards_api(request: FlashcardRequest):
+async def generate_flashcards_api(request: FlashcardRequest, namespace: str = Depends(get_user_namespace)):
     """
     Generate flashcards from uploaded PDF documents.
     
@@ -571,51 +1800,93 @@ async def generate_flashcards_api(request: FlashcardRequest):
     - num_flashcards: Number of flashcards to generate (default: 5)
     - difficulty: Difficulty level - easy, medium, or hard (default: easy)
     
-    Returns flashcards with questions and answers based on the uploaded document content.
+    Returns flashcards with questions and answers based on the uploaded document content,
+    drawn from the pre-generated bank when it has enough (see BANK_ITEMS_PER_DIFFICULTY).
     """
-    if request.num_flashcards < 1 or request.num_flashcards > 5:
-        raise HTTPException(status_code=400, detail="Number of flashcards must be between 1 and 5")
-    
-    if request.difficulty not in ["easy", "medium", "hard"]:
-        raise HTTPException(status_code=400, detail="Difficulty must be 'easy', 'medium', or 'hard'")
+    validate_flashcard_request(request)
+
+    drawn = await draw_from_bank(namespace, "flashcard", request.difficulty, request.num_flashcards)
+    if drawn is not None:
+        return FlashcardResponse(flashcards=drawn["items"], sources=drawn["sources"])
     
-    result = generate_flashcards_from_rag(
+    key = ("flashcards", request.num_flashcards, request.difficulty, namespace, document_version(namespace))
+    result = await generation_flight.do(key, lambda: generate_flashcards_from_rag(
         num_flashcards=request.num_flashcards,
-        difficulty=request.difficulty
-    )
+        difficulty=request.difficulty,
+        namespace=namespace
+    ))
     
     return FlashcardResponse(
         flashcards=result["flashcards"],
         sources=result["sources"]
     )
 
+@app.post("/generate-flashcards/stream")
+async def stream_flashcards_api(request: FlashcardRequest, namespace: str = Depends(get_user_namespace)):
+    """
+    Streaming variant of /generate-flashcards using Server-Sent Events.
+    Emits the source document IDs, then each flashcard as soon as it is generated and validated.
+    """
+    validate_flashcard_request(request)
+
+    return StreamingResponse(
+        stream_generation(
+            FLASHCARD_PROMPT_TEMPLATE, "num_flashcards", request.num_flashcards,
+            request.difficulty, parse_flashcard, "flashcard", namespace
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/generate-quiz", response_model=QuizResponse)
-async def generate_quiz_api(request: QuizRequest):
+async def generate_quiz_api(request: QuizRequest, namespace: str = Depends(get_user_namespace)):
     """
     Generate a quiz from uploaded PDF documents.
     
     Parameters:
     - num_questions: Number of quiz questions to generate (default: 8)
     - difficulty: Difficulty level - easy, medium, or hard (default: easy)
+    - parallel: Generate from document sections concurrently, then merge and deduplicate (default: false)
     
-    Returns quiz questions with multiple choice options and correct answers based on the uploaded document content.
+    Returns quiz questions with multiple choice options and correct answers based on the uploaded document content,
+    drawn from the pre-generated bank when it has enough (see BANK_ITEMS_PER_DIFFICULTY).
     """
-    if request.num_questions < 1 or request.num_questions > 8:
-        raise HTTPException(status_code=400, detail="Number of questions must be between 1 and 8")
-    
-    if request.difficulty not in ["easy", "medium", "hard"]:
-        raise HTTPException(status_code=400, detail="Difficulty must be 'easy', 'medium', or 'hard'")
+    validate_quiz_request(request)
+
+    drawn = await draw_from_bank(namespace, "question", request.difficulty, request.num_questions)
+    if drawn is not None:
+        return QuizResponse(questions=drawn["items"], sources=drawn["sources"])
     
-    result = generate_quiz_from_rag(
+    key = ("quiz", request.num_questions, request.difficulty, request.parallel, namespace, document_version(namespace))
+    result = await generation_flight.do(key, lambda: generate_quiz_from_rag(
         num_questions=request.num_questions,
-        difficulty=request.difficulty
-    )
+        difficulty=request.difficulty,
+        parallel=request.parallel,
+        namespace=namespace
+    ))
     
     return QuizResponse(
         questions=result["questions"],
         sources=result["sources"]
     )
 
+@app.post("/generate-quiz/stream")
+async def stream_quiz_api(request: QuizRequest, namespace: str = Depends(get_user_namespace)):
+    """
+    Streaming variant of /generate-quiz using Server-Sent Events.
+    Emits the source document IDs, then each question as soon as it is generated and validated.
+    """
+    validate_quiz_request(request)
+
+    return StreamingResponse(
+        stream_generation(
+            QUIZ_PROMPT_TEMPLATE, "num_questions", request.num_questions,
+            request.difficulty, parse_quiz_question, "question", namespace
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -625,10 +1896,16 @@ async def root():
         "status": "healthy",
         "endpoints": {
             "upload": "/upload-documents",
+            "jobs": "/jobs/{job_id}",
             "query": "/query",
+            "query_stream": "/query/stream",
+            "query_batch": "/query/batch",
             "generate_flashcards": "/generate-flashcards",
+            "generate_flashcards_stream": "/generate-flashcards/stream",
             "generate_quiz": "/generate-quiz",
-            "health": "/health"
+            "generate_quiz_stream": "/generate-quiz/stream",
+            "health": "/health",
+            "ready": "/ready"
         }
     }
 
@@ -636,16 +1913,63 @@ async def root():
 async def health_check():
     """Health check endpoint for Vercel"""
     try:
+        start_backend_init()
         vectorstore_status = "initialized" if vectorstore is not None else "not_initialized"
         
         return {
             "status": "healthy",
+            "ready": backend_state["ready"],
+            "backend_error": backend_state["error"],
             "vectorstore": vectorstore_status,
+            "vector_backend": VECTOR_BACKEND,
             "pinecone_index": INDEX_NAME,
-            "timestamp": "2024-01-01T00:00:00Z"
+            "query_cache": query_cache.stats(),
+            "embedding_cache": embeddings.stats() if embeddings is not None else None,
+            "keyword_index": keyword_index.stats(),
+            "generation": generation_flight.stats(),
+            "item_bank": await asyncio.to_thread(item_bank.stats),
+            "llm_scheduler": llm_scheduler.stats(),
+            "embedding_scheduler": embedding_scheduler.stats(),
+            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "error": str(e)
         }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition of stage latencies, token and chunk counters"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiler", response_class=PlainTextResponse)
+async def get_profile(limit: Optional[int] = None):
+    """Collapsed stacks sampled so far (flamegraph.pl / speedscope input); needs PROFILER_ENDPOINT=true"""
+    if not PROFILER_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(profiler.collapsed(limit))
+
+@app.post("/debug/profiler")
+async def toggle_profiler(enabled: bool, interval_ms: Optional[float] = None):
+    """Start (clearing earlier samples) or stop the sampling profiler; needs PROFILER_ENDPOINT=true"""
+    if not PROFILER_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if interval_ms is not None and not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if enabled:
+        profiler.start(interval=interval_ms / 1000 if interval_ms is not None else None)
+    else:
+        await asyncio.to_thread(profiler.stop)
+    return profiler.stats()
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once OpenAI and Pinecone clients are initialized, 503 before"""
+    start_backend_init()
+    if not backend_state["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "error": backend_state["error"]}
+        )
+    return {"ready": True, "ready_at": backend_state["ready_at"]}
@@ -0,0 +1,72 @@
+"""
+Load test for /query with stubbed OpenAI and vector index backends.
+
+Fires N /query requests at once through the ASGI app and reports wall
+time against the single-request latency, and how many fake model calls
+were in flight at the same time. On the async path the requests overlap
+(wall time close to one request, peak in flight up to LLM_CONCURRENCY);
+with --blocking the fake clients block the event loop the way the
+synchronous calls used to, and the same requests queue behind each other.
+
+    python bench_concurrency.py [--requests 32] [--llm-ms 500] [--embed-ms 50] [--search-ms 50] [--blocking]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench_stubs import FakeChatModel, FakeEmbeddings, FakeVectorIndex, lecture_chunks, load_app, seed_index
+
+
+async def timed_query(client: httpx.AsyncClient, question: str) -> float:
+    started = time.perf_counter()
+    response = await client.post("/query", params={"query": question})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def main_async(args) -> None:
+    embeddings = FakeEmbeddings(latency=args.embed_ms / 1000, blocking=args.blocking)
+    model = FakeChatModel(first_token_latency=args.llm_ms / 1000, output_token_latency=0, blocking=args.blocking)
+    index = FakeVectorIndex(latency=args.search_ms / 1000)
+    app = load_app(embeddings, model, index)
+    # Anonymous requests read the shared library; the chunk store feeds keyword search
+    chunks = lecture_chunks(50)
+    seed_index(index, chunks, app.SHARED_NAMESPACE)
+    app.chunk_store.add_chunks(chunks, app.SHARED_NAMESPACE)
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Distinct questions so neither the exact nor the semantic cache answers them
+        single = [await timed_query(client, f"Warm-up question {i}?") for i in range(3)]
+        model.in_flight.peak = 0
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(
+            timed_query(client, f"What does section {i} say about transport?") for i in range(args.requests)
+        ))
+        wall = time.perf_counter() - started
+
+    one = statistics.median(single)
+    mode = "blocking clients" if args.blocking else "async clients"
+    print(f"{args.requests} concurrent /query requests ({mode}, LLM_CONCURRENCY={app.llm_scheduler.concurrency})")
+    print(f"  single request:   {one * 1000:7.0f} ms")
+    print(f"  wall time:        {wall * 1000:7.0f} ms  ({wall / one:.1f}x a single request, {args.requests}x if serial)")
+    print(f"  request p50/max:  {statistics.median(latencies) * 1000:7.0f} / {max(latencies) * 1000:.0f} ms")
+    print(f"  peak model calls in flight: {model.in_flight.peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--llm-ms", type=float, default=500)
+    parser.add_argument("--embed-ms", type=float, default=50)
+    parser.add_argument("--search-ms", type=float, default=50)
+    parser.add_argument("--blocking", action="store_true", help="simulate synchronous OpenAI calls on the event loop")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Flashcard prompt size and latency as the document grows.
+
+For each page count the chunk store is filled with a synthetic document
+and flashcards are generated twice with a stubbed model whose latency
+grows with the prompt: once from the page-stratified, token-budgeted
+context (select_context_chunks, GENERATION_CONTEXT_TOKENS) and once from
+every chunk joined, as before. Prompt tokens are counted with tiktoken;
+prompts over gpt-4o's 128k-token context window are flagged, since the
+real API would reject them.
+
+    python bench_generation_context.py [--pages 10,50,200,800] [--prefill-tokens-per-s 20000]
+"""
+import argparse
+import asyncio
+import time
+
+from bench_stubs import FakeChatModel, lecture_chunks, load_app
+from context_packing import count_tokens
+
+MODEL_CONTEXT_TOKENS = 128_000
+
+
+async def generate(app, model: FakeChatModel, context_text: str) -> tuple:
+    """Returns (prompt tokens, seconds) for one 5-flashcard generation"""
+    calls = model.calls
+    started = time.perf_counter()
+    cards = [
+        card async for card in app.stream_generated_items(
+            app.FLASHCARD_PROMPT_TEMPLATE, "num_flashcards", 5, "easy", context_text, app.parse_flashcard
+        )
+    ]
+    elapsed = time.perf_counter() - started
+    assert len(cards) == 5 and model.calls == calls + 1
+    prompt = app.ChatPromptTemplate.from_template(app.FLASHCARD_PROMPT_TEMPLATE).format(
+        context=context_text, difficulty="easy", num_flashcards=5
+    )
+    return count_tokens(prompt), elapsed
+
+
+async def main_async(args) -> None:
+    model = FakeChatModel(
+        first_token_latency=args.first_token_ms / 1000,
+        token_latency=1 / args.prefill_tokens_per_s,
+        output_token_latency=1 / args.output_tokens_per_s,
+    )
+    app = load_app(chat_model=model)
+
+    print(f"GENERATION_CONTEXT_TOKENS={app.GENERATION_CONTEXT_TOKENS}")
+    print(f"{'pages':>6} {'chunks':>7} | {'selected':>9} {'tokens':>8} {'latency':>9} | {'all chunks':>10} {'latency':>9}")
+    for pages in args.pages:
+        namespace = f"bench-{pages}"
+        app.chunk_store.add_chunks(lecture_chunks(pages), namespace)
+
+        started = time.perf_counter()
+        context_docs, context_text = await app.get_generation_context(namespace)
+        select_seconds = time.perf_counter() - started
+        tokens, seconds = await generate(app, model, context_text)
+
+        all_docs = await app.get_document_chunks(namespace)
+        all_tokens, all_seconds = await generate(app, model, "\n\n---\n\n".join(d.page_content for d in all_docs))
+        over = " (over 128k)" if all_tokens > MODEL_CONTEXT_TOKENS else ""
+
+        print(
+            f"{pages:6d} {len(all_docs):7d} | {len(context_docs):9d} {tokens:8d} {(seconds + select_seconds):8.2f}s"
+            f" | {all_tokens:10d} {all_seconds:8.2f}s{over}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=lambda s: [int(p) for p in s.split(",")], default=[10, 50, 200, 800])
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=20000)
+    parser.add_argument("--output-tokens-per-s", type=float, default=200)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
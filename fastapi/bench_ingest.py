@@ -0,0 +1,60 @@
+"""
+Ingestion throughput (chunks/s) against embedding and upsert concurrency.
+
+Runs add_to_pinecone over the same synthetic chunks with fake embedding
+and index backends at each concurrency level (EMBED_CONCURRENCY and
+UPSERT_CONCURRENCY set together). An embedding request takes
+--embed-ms plus --embed-ms-per-chunk for each chunk in it, an upsert of
+up to UPSERT_BATCH vectors takes --upsert-ms.
+
+    python bench_ingest.py [--chunks 2000] [--concurrency 1,2,4,8,16] [--embed-ms 200] [--upsert-ms 80]
+"""
+import argparse
+import asyncio
+import time
+
+from bench_stubs import FakeEmbeddings, FakeVectorIndex, lecture_chunks, load_app
+
+
+async def main_async(args) -> None:
+    embeddings = FakeEmbeddings(latency=args.embed_ms / 1000, per_text_latency=args.embed_ms_per_chunk / 1000)
+    index = FakeVectorIndex(upsert_latency=args.upsert_ms / 1000)
+    app = load_app(embeddings, index=index)
+    app.embedding_scheduler.concurrency = max(args.concurrency)
+    pages = args.chunks // 3
+
+    print(f"{pages * 3} chunks, EMBED_BATCH_TOKENS={app.EMBED_BATCH_TOKENS}")
+    baseline = None
+    for concurrency in args.concurrency:
+        app.EMBED_CONCURRENCY = app.UPSERT_CONCURRENCY = concurrency
+        # A fresh source per run so ids and texts never repeat
+        chunks = lecture_chunks(pages, source=f"run{concurrency}.pdf")
+        calls, upserts = embeddings.calls, index.upserts
+        embeddings.in_flight.peak = index.in_flight.peak = 0
+
+        started = time.perf_counter()
+        await app.add_to_pinecone(chunks, namespace=f"bench-{concurrency}")
+        elapsed = time.perf_counter() - started
+
+        assert index.count(f"bench-{concurrency}") == len(chunks)
+        rate = len(chunks) / elapsed
+        baseline = baseline or rate
+        print(
+            f"concurrency {concurrency:3d}: {rate:8.0f} chunks/s ({rate / baseline:4.1f}x)  {elapsed:6.2f}s  "
+            f"{embeddings.calls - calls} embedding calls (peak {embeddings.in_flight.peak} in flight), "
+            f"{index.upserts - upserts} upserts (peak {index.in_flight.peak})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 2, 4, 8, 16])
+    parser.add_argument("--embed-ms", type=float, default=200)
+    parser.add_argument("--embed-ms-per-chunk", type=float, default=1)
+    parser.add_argument("--upsert-ms", type=float, default=80)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+PDF parsing: streaming process-pool loader against PyPDFLoader.
+
+Generates a synthetic multi-hundred-page PDF (or takes FILE.pdf) and
+parses it with each loader in a fresh subprocess, reporting wall time,
+time to the first page batch and peak RSS. PyPDFLoader materializes every
+page before returning; stream_pdf_pages yields page ranges as the pool
+finishes them and the benchmark drops them afterwards, as the ingestion
+pipeline does. Worker processes have their own address space, so their
+largest peak RSS is reported separately.
+
+    python bench_pdf_loader.py [FILE.pdf] [--pages 400] [--workers N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def make_pdf(path: str, pages: int, lines: int = 45, filler_mb: float = 0) -> None:
+    """
+    A text PDF with `pages` pages of `lines` lines each, plus `filler_mb` of
+    unreferenced stream data standing in for embedded images
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        text = "".join(
+            f"BT /F1 10 Tf 50 {760 - j * 16} Td (Page {i} line {j}: the electron transport chain pumps protons "
+            f"across the inner membrane) Tj ET\n"
+            for j in range(lines)
+        )
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(text)} >>\nstream\n{text}endstream")
+    if filler_mb:
+        filler = os.urandom(int(filler_mb * 1024 * 1024) // 2).hex()
+        objects.append(f"<< /Length {len(filler)} /Filter /ASCIIHexDecode >>\nstream\n{filler}endstream")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w") as f:
+        f.write(out)
+
+
+def peak_rss_mb(who: int) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024  # KiB on Linux
+
+
+def run_pypdf(path: str) -> dict:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    started = time.perf_counter()
+    pages = PyPDFLoader(path).load()
+    elapsed = time.perf_counter() - started
+    return {"pages": len(pages), "seconds": elapsed, "first_pages": elapsed}
+
+
+def run_streaming(path: str) -> dict:
+    import pdf_loader
+
+    async def consume():
+        started = time.perf_counter()
+        first = None
+        pages = 0
+        async for batch in pdf_loader.stream_pdf_pages(path):
+            first = first if first is not None else time.perf_counter() - started
+            pages += len(batch)
+        return {"pages": pages, "seconds": time.perf_counter() - started, "first_pages": first}
+
+    result = asyncio.run(consume())
+    pdf_loader.get_pdf_executor().shutdown(wait=True)  # so the workers count in RUSAGE_CHILDREN
+    return result
+
+
+def child(variant: str, path: str) -> None:
+    result = run_pypdf(path) if variant == "pypdf" else run_streaming(path)
+    result["rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF)
+    result["worker_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps(result))
+
+
+def measure(variant: str, path: str, workers: int) -> dict:
+    env = {**os.environ, "PDF_PARSE_WORKERS": str(workers)}
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", variant, path], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--child", nargs=2, metavar=("VARIANT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.pdf")
+        make_pdf(path, args.pages)
+    print(f"{path}: {os.path.getsize(path) / 1024 / 1024:.1f} MB, {args.workers} workers")
+    for name, variant in (("PyPDFLoader", "pypdf"), ("stream_pdf_pages", "streaming")):
+        r = measure(variant, path, args.workers)
+        print(
+            f"{name:>16}: {r['pages']} pages in {r['seconds']:6.2f}s, first pages after {r['first_pages']:6.2f}s, "
+            f"peak RSS {r['rss_mb']:6.1f} MB (largest worker {r['worker_rss_mb']:.1f} MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
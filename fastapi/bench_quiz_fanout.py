@@ -0,0 +1,60 @@
+"""
+Quiz latency: one generation call against the per-section fan-out.
+
+Generates quizzes from a synthetic document with a stubbed model whose
+latency is a time to first token, plus a prefill cost per prompt token and
+a decode cost per completion token, so a call asking for fewer questions
+from a smaller context finishes sooner. Reports median latency, model
+calls and prompt tokens per quiz for `parallel=false` and `parallel=true`
+(which also embeds the questions once to drop near-duplicates).
+
+    python bench_quiz_fanout.py [--pages 120] [--questions 8] [--runs 3] [--output-tokens-per-s 60]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from bench_stubs import FakeChatModel, FakeEmbeddings, lecture_chunks, load_app
+
+
+async def main_async(args) -> None:
+    model = FakeChatModel(
+        first_token_latency=args.first_token_ms / 1000,
+        token_latency=1 / args.prefill_tokens_per_s,
+        output_token_latency=1 / args.output_tokens_per_s,
+    )
+    app = load_app(FakeEmbeddings(latency=args.embed_ms / 1000), model)
+    app.chunk_store.add_chunks(lecture_chunks(args.pages), "bench")
+
+    print(f"{args.pages} pages, {args.questions} questions, QUIZ_SECTIONS={app.QUIZ_SECTIONS}")
+    for name, parallel in (("single call", False), ("fan-out", True)):
+        timings = []
+        calls = model.calls
+        prompts = len(model.prompt_tokens)
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = await app.generate_quiz_from_rag(args.questions, "medium", parallel=parallel, namespace="bench")
+            timings.append(time.perf_counter() - started)
+            assert len(result["questions"]) == args.questions
+        prompt_tokens = sum(model.prompt_tokens[prompts:]) / args.runs
+        print(
+            f"{name:>12}: median {statistics.median(timings):5.2f}s  min {min(timings):5.2f}s  "
+            f"{(model.calls - calls) / args.runs:.0f} model calls, {prompt_tokens:.0f} prompt tokens per quiz"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--questions", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=20000)
+    parser.add_argument("--output-tokens-per-s", type=float, default=60)
+    parser.add_argument("--embed-ms", type=float, default=100)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Offline retrieval benchmark for hybrid search.
+
+Compares vector-only, BM25-only and reciprocal-rank-fused retrieval on a
+small fixture corpus of lecture-style chunks, reporting recall@k, MRR and
+per-query latency of the keyword stage. No OpenAI or Pinecone access is
+needed: the vector stage uses a hashed character-trigram embedding as a
+stand-in, which, like real embeddings, is fuzzy about exact terms.
+
+    python bench_retrieval.py [--k 5] [--repeat 1000] [--scale 50]
+
+`--scale` pads the index with that many copies of the corpus (with
+distinct ids) to measure keyword latency on a larger document.
+"""
+import argparse
+import hashlib
+import statistics
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+
+CORPUS = [
+    ("lec.pdf:0:0", "Big-O notation describes the asymptotic upper bound of an algorithm's running time. O(n log n) sorting algorithms include merge sort and heapsort."),
+    ("lec.pdf:0:1", "Quicksort has an average running time of O(n log n) but degrades to O(n^2) when pivots are chosen poorly, for example on already sorted input."),
+    ("lec.pdf:1:0", "Dijkstra's algorithm computes single-source shortest paths in graphs with non-negative edge weights using a priority queue."),
+    ("lec.pdf:1:1", "The Bellman-Ford algorithm handles negative edge weights and detects negative cycles in O(VE) time."),
+    ("lec.pdf:2:0", "A hash table offers expected O(1) lookups. Collisions are resolved by chaining or open addressing with linear probing."),
+    ("lec.pdf:2:1", "The load factor of a hash table is the number of stored entries divided by the number of buckets; resizing keeps it bounded."),
+    ("lec.pdf:3:0", "TCP provides reliable, ordered delivery using sequence numbers, acknowledgements and retransmission; UDP is connectionless."),
+    ("lec.pdf:3:1", "The three-way handshake (SYN, SYN-ACK, ACK) establishes a TCP connection before any data is sent."),
+    ("lec.pdf:4:0", "Photosynthesis converts light energy into chemical energy: 6CO2 + 6H2O -> C6H12O6 + 6O2, taking place in the chloroplasts."),
+    ("lec.pdf:4:1", "The Calvin cycle fixes carbon dioxide using ATP and NADPH produced by the light-dependent reactions."),
+    ("lec.pdf:5:0", "Mitochondria produce ATP through oxidative phosphorylation; the electron transport chain pumps protons across the inner membrane."),
+    ("lec.pdf:5:1", "Glycolysis splits one glucose molecule into two pyruvate molecules in the cytoplasm, yielding a net gain of two ATP."),
+    ("lec.pdf:6:0", "Newton's second law states F = ma: the net force on an object equals its mass times its acceleration."),
+    ("lec.pdf:6:1", "Kinetic energy is KE = 1/2 mv^2, and work done by a constant force is the force times the displacement along it."),
+    ("lec.pdf:7:0", "The Treaty of Westphalia in 1648 ended the Thirty Years' War and established the principle of state sovereignty."),
+    ("lec.pdf:7:1", "The Congress of Vienna (1814-1815) redrew the map of Europe after the defeat of Napoleon."),
+    ("lec.pdf:8:0", "A t-test compares the means of two groups; the p-value is the probability of data at least as extreme under the null hypothesis."),
+    ("lec.pdf:8:1", "ANOVA generalizes the t-test to three or more groups by comparing between-group and within-group variance."),
+    ("lec.pdf:9:0", "In SQL, a LEFT JOIN returns every row of the left table, with NULLs where the right table has no match."),
+    ("lec.pdf:9:1", "Database normalization into 3NF removes transitive dependencies so that non-key attributes depend only on the key."),
+]
+
+# (query, relevant chunk id)
+QUERIES = [
+    ("What is the running time of merge sort?", "lec.pdf:0:0"),
+    ("When is quicksort O(n^2)?", "lec.pdf:0:1"),
+    ("shortest paths with non-negative weights", "lec.pdf:1:0"),
+    ("Bellman-Ford negative cycles", "lec.pdf:1:1"),
+    ("How are hash collisions handled?", "lec.pdf:2:0"),
+    ("What is the load factor?", "lec.pdf:2:1"),
+    ("SYN-ACK", "lec.pdf:3:1"),
+    ("Is UDP connectionless?", "lec.pdf:3:0"),
+    ("6CO2 + 6H2O", "lec.pdf:4:0"),
+    ("What does the Calvin cycle use NADPH for?", "lec.pdf:4:1"),
+    ("electron transport chain", "lec.pdf:5:0"),
+    ("How much ATP does glycolysis yield?", "lec.pdf:5:1"),
+    ("F = ma", "lec.pdf:6:0"),
+    ("formula for kinetic energy", "lec.pdf:6:1"),
+    ("What happened in 1648?", "lec.pdf:7:0"),
+    ("Congress of Vienna", "lec.pdf:7:1"),
+    ("What is a p-value?", "lec.pdf:8:0"),
+    ("ANOVA", "lec.pdf:8:1"),
+    ("LEFT JOIN NULL", "lec.pdf:9:0"),
+    ("3NF transitive dependencies", "lec.pdf:9:1"),
+]
+
+
+def trigram_embedding(text: str, dims: int = 256) -> np.ndarray:
+    """Hashed character-trigram vector, L2-normalized"""
+    padded = f"  {text.lower()}  "
+    vector = np.zeros(dims, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        bucket = int.from_bytes(hashlib.md5(padded[i:i + 3].encode()).digest()[:4], "little") % dims
+        vector[bucket] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def build_corpus(scale: int) -> List[Document]:
+    docs = [Document(page_content=text, metadata={"id": chunk_id}) for chunk_id, text in CORPUS]
+    for copy in range(1, scale):
+        docs.extend(
+            Document(page_content=text, metadata={"id": f"pad{copy}-{chunk_id}"}) for chunk_id, text in CORPUS
+        )
+    return docs
+
+
+def evaluate(name: str, search, k: int) -> None:
+    hits = 0
+    reciprocal_ranks = []
+    for query, relevant in QUERIES:
+        ids = [doc.metadata["id"] for doc, _score in search(query)][:k]
+        rank = ids.index(relevant) + 1 if relevant in ids else None
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    print(f"{name:<10} recall@{k}={hits / len(QUERIES):.2f}  MRR={statistics.mean(reciprocal_ranks):.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    docs = build_corpus(1)
+    matrix = np.stack([trigram_embedding(d.page_content) for d in docs])
+    index = KeywordIndex()
+    index.add(docs)
+
+    def vector_search(query):
+        scores = matrix @ trigram_embedding(query)
+        return [(docs[i], float(scores[i])) for i in np.argsort(-scores)[:args.candidates]]
+
+    def keyword_search(query):
+        return index.search(query, args.candidates)
+
+    def hybrid_search(query):
+        return reciprocal_rank_fusion([vector_search(query), keyword_search(query)], k=args.k)
+
+    print(f"{len(docs)} chunks, {len(QUERIES)} queries")
+    evaluate("vector", vector_search, args.k)
+    evaluate("bm25", keyword_search, args.k)
+    evaluate("hybrid", hybrid_search, args.k)
+
+    big = KeywordIndex()
+    started = time.perf_counter()
+    big.add(build_corpus(args.scale))
+    build_ms = (time.perf_counter() - started) * 1000
+    timings = []
+    for _ in range(args.repeat):
+        for query, _relevant in QUERIES:
+            started = time.perf_counter()
+            big.search(query, args.candidates)
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    print(
+        f"bm25 latency over {big.stats()['chunks']} chunks (build {build_ms:.1f} ms): "
+        f"p50={timings[len(timings) // 2]:.0f}us  p99={timings[int(len(timings) * 0.99)]:.0f}us"
+    )
+
+
+if __name__ == "__main__":
+    main()
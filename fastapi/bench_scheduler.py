@@ -0,0 +1,157 @@
+"""
+Simulate the LLM scheduler on a fake clock with a fake model.
+
+A burst of quiz/flashcard generations and a bank build arrive together,
+while chat questions keep arriving every couple of seconds. The run is
+repeated with every call in one FIFO class, and with priority classes but
+unbounded queues, to separate what priorities buy interactive latency
+from what the bounded queues shed: with the default limits most of the
+generation burst is rejected with 503 rather than queued. A fraction of
+calls fail with 429 to exercise the retries. No network, and it finishes
+instantly whatever the simulated duration.
+
+    python bench_scheduler.py [--tpm 90000] [--rpm 500] [--concurrency 8] [--rate-limit-errors 0.05]
+                              [--queue-limits 64,16,1024]
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+import statistics
+
+from scheduler import GENERATION, INGESTION, INTERACTIVE, PRIORITY_NAMES, Overloaded, Scheduler
+
+
+class FakeClock:
+    """Virtual time: `sleep` parks the caller until `run` advances the clock to its deadline"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers = []
+        self._seq = itertools.count()
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(seconds, 0.0), next(self._seq), future))
+        await future
+
+    async def run(self, coro):
+        """Run `coro` to completion, jumping ahead whenever every task is waiting on the clock"""
+        task = asyncio.ensure_future(coro)
+        while not task.done():
+            for _ in range(50):
+                await asyncio.sleep(0)
+            while self._sleepers and self._sleepers[0][2].cancelled():
+                heapq.heappop(self._sleepers)
+            if task.done() or not self._sleepers:
+                continue
+            deadline, _seq, future = heapq.heappop(self._sleepers)
+            self.now = max(self.now, deadline)
+            future.set_result(None)
+        return task.result()
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FakeModel:
+    def __init__(self, clock: FakeClock, error_rate: float):
+        self.clock = clock
+        self.error_rate = error_rate
+        self.calls = 0
+
+    async def complete(self, seconds: float) -> str:
+        self.calls += 1
+        if random.random() < self.error_rate:
+            await self.clock.sleep(0.2)
+            raise RateLimitError("429 Too Many Requests")
+        await self.clock.sleep(seconds)
+        return "ok"
+
+
+UNBOUNDED = (10_000,) * 3
+
+
+async def scenario(args, fifo: bool, queue_limits) -> dict:
+    clock = FakeClock()
+    model = FakeModel(clock, args.rate_limit_errors)
+    scheduler = Scheduler(
+        "chat model",
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        queue_limits=queue_limits,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    latencies = {p: [] for p in PRIORITY_NAMES}
+    rejected = {p: 0 for p in PRIORITY_NAMES}
+
+    async def call(priority: int, tokens: int, seconds: float, start: float) -> None:
+        await clock.sleep(start)
+        started = clock()
+        try:
+            await scheduler.run(lambda: model.complete(seconds), INTERACTIVE if fifo else priority, tokens)
+        except Overloaded:
+            rejected[priority] += 1
+            return
+        latencies[priority].append(clock() - started)
+
+    calls = [call(GENERATION, 7000, 8.0, 0.0) for _ in range(args.generations)]
+    calls += [call(INGESTION, 6000, 8.0, 0.0) for _ in range(args.bank_calls)]
+    calls += [call(INTERACTIVE, 1500, 2.0, 1.0 + i * args.chat_interval) for i in range(args.chats)]
+    await clock.run(asyncio.gather(*calls))
+    return {"latencies": latencies, "rejected": rejected, "finished_at": clock(), "model_calls": model.calls}
+
+
+def report(name: str, result: dict) -> None:
+    rejected = sum(result["rejected"].values())
+    print(
+        f"{name} (all done at t={result['finished_at']:.0f}s, {result['model_calls']} model calls, "
+        f"{rejected} calls rejected as overloaded):"
+    )
+    for priority, values in result["latencies"].items():
+        if not values and not result["rejected"][priority]:
+            continue
+        p95 = sorted(values)[int(len(values) * 0.95)] if values else float("nan")
+        median = statistics.median(values) if values else float("nan")
+        print(
+            f"  {PRIORITY_NAMES[priority]:>11}: {len(values):3d} done, p50 {median:6.1f}s  p95 {p95:6.1f}s"
+            f"  rejected {result['rejected'][priority]}"
+        )
+
+
+async def main_async(args) -> None:
+    limits = tuple(int(n) for n in args.queue_limits.split(","))
+    scenarios = (
+        ("single FIFO queue, unbounded", True, UNBOUNDED),
+        ("priority classes, unbounded queues", False, UNBOUNDED),
+        (f"priority classes, queue limits {args.queue_limits}", False, limits),
+    )
+    for name, fifo, queue_limits in scenarios:
+        random.seed(args.seed)
+        report(name, await scenario(args, fifo, queue_limits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tpm", type=float, default=90000)
+    parser.add_argument("--rpm", type=float, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--generations", type=int, default=60)
+    parser.add_argument("--bank-calls", type=int, default=24)
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--chat-interval", type=float, default=2.0)
+    parser.add_argument("--rate-limit-errors", type=float, default=0.05)
+    parser.add_argument("--queue-limits", default="64,16,1024", help="interactive,generation,ingestion")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
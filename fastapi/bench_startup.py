@@ -0,0 +1,97 @@
+"""
+Cold start: import time of app.py and time to the first successful requests.
+
+Each run is a fresh interpreter. It imports app (with stubbed OpenAI and
+vector index clients, no network), then sends GET /health (liveness) and
+POST /query through the ASGI app and records when each first succeeds. A
+separate fresh interpreter times the LangChain / Pinecone imports that
+app.py defers to first use, i.e. what every cold start paid up front
+before they were made lazy (on top of the network round trips).
+
+    python bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+DEFERRED_IMPORTS = [
+    "langchain_openai",
+    "langchain_pinecone",
+    "pinecone",
+    "langchain_text_splitters",
+    "langchain_community.document_loaders",
+]
+
+
+def child_app() -> dict:
+    import asyncio
+
+    started = time.perf_counter()
+    from bench_stubs import FakeChatModel, FakeEmbeddings, FakeVectorIndex, lecture_chunks, load_app, seed_index
+
+    index = FakeVectorIndex(latency=0)
+    app = load_app(FakeEmbeddings(latency=0), FakeChatModel(first_token_latency=0, output_token_latency=0), index)
+    imported = time.perf_counter()
+    chunks = lecture_chunks(5)
+    seed_index(index, chunks, app.SHARED_NAMESPACE)  # read by anonymous requests
+    app.chunk_store.add_chunks(chunks, app.SHARED_NAMESPACE)
+
+    async def first_requests():
+        import httpx
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench") as client:
+            (await client.get("/health")).raise_for_status()
+            health = time.perf_counter()
+            (await client.post("/query", params={"query": "What does section 1 say?"})).raise_for_status()
+            return health, time.perf_counter()
+
+    health, query = asyncio.run(first_requests())
+    return {"import": imported - started, "health": health - started, "query": query - started}
+
+
+def child_deferred() -> dict:
+    import importlib
+
+    started = time.perf_counter()
+    for name in DEFERRED_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    return {"deferred": time.perf_counter() - started}
+
+
+def run_child(kind: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", kind], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=["app", "deferred"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child_app() if args.child == "app" else child_deferred()))
+        return
+
+    runs = [run_child("app") for _ in range(args.runs)]
+    deferred = [run_child("deferred")["deferred"] for _ in range(args.runs)]
+
+    def report(label, values):
+        print(f"{label:>34}: median {statistics.median(values) * 1000:7.0f} ms  min {min(values) * 1000:7.0f} ms")
+
+    print(f"{args.runs} cold starts")
+    report("import app", [r["import"] for r in runs])
+    report("first /health after start", [r["health"] for r in runs])
+    report("first /query after start (stubs)", [r["query"] for r in runs])
+    report("deferred imports (not at startup)", deferred)
+
+
+if __name__ == "__main__":
+    main()
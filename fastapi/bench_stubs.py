@@ -0,0 +1,264 @@
+"""
+Stand-ins for OpenAI and the vector index so the benchmarks can drive
+app.py end to end without network access or API keys.
+
+`load_app()` points every local store at a temp directory, imports app and
+swaps its OpenAI clients (behind the real embedding cache) and vector
+index for the fakes below.
+Latencies are simulated: the fake OpenAI clients await asyncio.sleep (or
+block the thread with time.sleep when `blocking=True`, like a synchronous
+client called from a coroutine), and the fake index sleeps in its worker
+thread like the Pinecone client does.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from vector_backends import VectorBackend
+
+EMBEDDING_DIMENSION = 1536
+
+
+def fake_vector(text: str, dimension: int = EMBEDDING_DIMENSION) -> List[float]:
+    """Deterministic unit vector for `text`"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class InFlight:
+    """Counts concurrent calls and remembers the peak"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+
+
+async def _wait(seconds: float, blocking: bool) -> None:
+    if blocking:
+        time.sleep(seconds)
+    else:
+        await asyncio.sleep(seconds)
+
+
+class FakeEmbeddings:
+    """`latency` seconds per request plus `per_text_latency` per input text"""
+
+    model = "fake-embedding"
+    dimensions = EMBEDDING_DIMENSION
+
+    def __init__(self, latency: float = 0.05, per_text_latency: float = 0.0, blocking: bool = False):
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.blocking = blocking
+        self.calls = 0
+        self.batch_sizes = []
+        self.in_flight = InFlight()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.batch_sizes.append(len(texts))
+        with self.in_flight:
+            await _wait(self.latency + self.per_text_latency * len(texts), self.blocking)
+        return [fake_vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls}
+
+
+class FakeChatModel:
+    """
+    Answers /query prompts with a sentence and generation prompts with a
+    valid JSON array of the requested flashcards or quiz questions. A call
+    takes `first_token_latency` plus `token_latency` per prompt token (the
+    model reading the context) and per completion token.
+    """
+
+    def __init__(
+        self,
+        first_token_latency: float = 0.3,
+        token_latency: float = 0.0,
+        output_token_latency: float = 0.01,
+        blocking: bool = False,
+    ):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.output_token_latency = output_token_latency
+        self.blocking = blocking
+        self.calls = 0
+        self.prompt_tokens = []
+        self.in_flight = InFlight()
+
+    def _answer(self, prompt: str) -> str:
+        match = re.search(r"generate (\d+) (flashcards|multiple-choice)", prompt)
+        if match is None:
+            return "Mitochondria make ATP through oxidative phosphorylation."
+        n = int(match.group(1))
+        if match.group(2) == "flashcards":
+            items = [{"question": f"Flashcard {self.calls}-{i}?", "answer": "An answer."} for i in range(n)]
+        else:
+            items = [
+                {
+                    "question": f"Which statement about topic {self.calls}-{i} is true?",
+                    "options": ["A", "B", "C", "D"],
+                    "correct_answer": "B",
+                }
+                for i in range(n)
+            ]
+        return json.dumps(items, indent=2)
+
+    def _start(self, prompt) -> tuple:
+        self.calls += 1
+        prompt = str(prompt)
+        prompt_tokens = len(prompt) // 4 + 1
+        self.prompt_tokens.append(prompt_tokens)
+        answer = self._answer(prompt)
+        return answer, self.first_token_latency + self.token_latency * prompt_tokens
+
+    async def ainvoke(self, prompt, **kwargs) -> AIMessage:
+        answer, delay = self._start(prompt)
+        with self.in_flight:
+            await _wait(delay + self.output_token_latency * (len(answer) // 4 + 1), self.blocking)
+        return AIMessage(content=answer)
+
+    async def astream(self, prompt, **kwargs):
+        answer, delay = self._start(prompt)
+        with self.in_flight:
+            await _wait(delay, self.blocking)
+            for i in range(0, len(answer), 16):
+                await _wait(self.output_token_latency * 4, self.blocking)
+                yield AIMessageChunk(content=answer[i:i + 16])
+
+
+class FakeVectorIndex(VectorBackend):
+    """In-memory vector index; every call blocks its worker thread for `latency` seconds"""
+
+    name = "fake"
+    dimension = EMBEDDING_DIMENSION
+
+    def __init__(self, latency: float = 0.05, upsert_latency: float = None):
+        self.latency = latency
+        self.upsert_latency = latency if upsert_latency is None else upsert_latency
+        self.upserts = 0
+        self.in_flight = InFlight()
+        self._lock = threading.Lock()
+        self._namespaces = {}
+
+    def upsert(self, vectors, namespace=""):
+        with self.in_flight:
+            time.sleep(self.upsert_latency)
+        with self._lock:
+            self.upserts += 1
+            ns = self._namespaces.setdefault(namespace, {})
+            for v in vectors:
+                ns[v["id"]] = (np.asarray(v["values"], dtype=np.float32), dict(v["metadata"]))
+
+    def delete(self, ids, namespace=""):
+        with self._lock:
+            ns = self._namespaces.get(namespace, {})
+            for chunk_id in ids:
+                ns.pop(chunk_id, None)
+
+    def delete_all(self, namespace=""):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+    def count(self, namespace=""):
+        with self._lock:
+            return len(self._namespaces.get(namespace, {}))
+
+    def existing(self, ids, namespace=""):
+        with self._lock:
+            ns = self._namespaces.get(namespace, {})
+            return {chunk_id for chunk_id in ids if chunk_id in ns}
+
+    def search(self, embedding, k=5, namespace=""):
+        with self.in_flight:
+            time.sleep(self.latency)
+        with self._lock:
+            items = list(self._namespaces.get(namespace, {}).items())
+        if not items:
+            return []
+        matrix = np.stack([vector for _id, (vector, _meta) in items])
+        scores = matrix @ np.asarray(embedding, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [
+            (Document(page_content=items[i][1][1]["text"], metadata=items[i][1][1]), float(scores[i])) for i in top
+        ]
+
+
+def lecture_chunks(pages: int, chunks_per_page: int = 3, source: str = "lecture.pdf") -> List[Document]:
+    """Chunk-sized paragraphs with source:page:idx ids, like calculate_chunk_ids produces; texts differ per source"""
+    words = "cell membrane protein enzyme energy gradient transport signal receptor pathway".split()
+    chunks = []
+    for page in range(pages):
+        for idx in range(chunks_per_page):
+            text = " ".join(words[(page + idx + i) % len(words)] for i in range(120))
+            chunks.append(Document(
+                page_content=f"{source} page {page} section {idx}: {text}.",
+                metadata={"id": f"{source}:{page}:{idx}", "source": source, "page": page},
+            ))
+    return chunks
+
+
+def seed_index(index: FakeVectorIndex, chunks: List[Document], namespace: str = "") -> None:
+    index.upsert(
+        [
+            {"id": c.metadata["id"], "values": fake_vector(c.page_content), "metadata": {**c.metadata, "text": c.page_content}}
+            for c in chunks
+        ],
+        namespace,
+    )
+
+
+def load_app(embeddings=None, chat_model=None, index=None, **env):
+    """
+    Import app.py against temp stores and the given fakes (defaults for
+    any left out). Extra keyword arguments are set as environment
+    variables first, e.g. EMBED_CONCURRENCY="8".
+    """
+    tmp = tempfile.mkdtemp(prefix="neo-bench-")
+    defaults = {
+        "OPENAI_API_KEY": "bench",
+        "VECTOR_BACKEND": "local",
+        "CHUNK_STORE_PATH": os.path.join(tmp, "chunks.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embeddings.sqlite3"),
+        "ITEM_BANK_PATH": os.path.join(tmp, "bank.sqlite3"),
+        "LOCAL_INDEX_PATH": os.path.join(tmp, "vectors"),
+    }
+    for name, value in {**defaults, **env}.items():
+        os.environ[name] = str(value)
+
+    import app
+
+    embeddings = embeddings or FakeEmbeddings()
+    chat_model = chat_model or FakeChatModel()
+    # Behind the real embedding cache and scheduler, as the OpenAI client would be
+    app.clients.embeddings = lambda model, dimensions: embeddings
+    app.embeddings = None
+    app.get_chat_model = lambda temperature=None: chat_model
+    app.vectorstore = index or FakeVectorIndex()
+    return app
@@ -0,0 +1,169 @@
+"""
+Upload latency: the old temp-file upload path against the in-memory one.
+
+Each variant starts from the received upload and reports the time until
+the first page range is parsed and split into chunks, and until every page
+is parsed. The old path copies into a NamedTemporaryFile, fsyncs, re-reads
+the file to hash it and parses from the path; the new one hashes while
+copying into an UploadBuffer and parses from memory (or from its single
+temp file when the upload is larger than --spool-mb), handing the bytes to
+the worker pool once through shared memory. "bytes per task" replays the
+first in-memory version, which pickled the whole upload to a worker for
+the page count and again for every page range.
+
+Without FILE.pdf a synthetic upload of --pages text pages plus
+--filler-mb of image-like data is generated.
+
+    python bench_upload.py [FILE.pdf] [--pages 200] [--filler-mb 12] [--runs 5] [--spool-mb 16]
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import math
+import os
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from starlette.datastructures import UploadFile
+
+from bench_pdf_loader import make_pdf
+from pdf_loader import (
+    PDF_PAGES_PER_TASK,
+    PDF_PARSE_WORKERS,
+    count_pages,
+    extract_page_range,
+    get_pdf_executor,
+    stream_pdf_pages,
+)
+from upload_buffer import receive_upload
+
+# Same settings as app.split_documents (importing app needs API keys)
+splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=80, length_function=len, is_separator_regex=False)
+
+
+async def parse(pages_iter) -> tuple:
+    """(seconds to the first chunks, seconds to the last page) from now"""
+    started = time.perf_counter()
+    first = None
+    async for pages in pages_iter:
+        if first is None:
+            await asyncio.to_thread(splitter.split_documents, pages)
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def pages_sent_per_task(data: bytes):
+    """The first in-memory loader: the bytes are pickled with every task"""
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+    total = await loop.run_in_executor(executor, count_pages, data)
+    pages_per_task = max(PDF_PAGES_PER_TASK, math.ceil(total / (PDF_PARSE_WORKERS * 4)))
+    futures = [
+        loop.run_in_executor(executor, extract_page_range, data, start, min(start + pages_per_task, total))
+        for start in range(0, total, pages_per_task)
+    ]
+    for future in futures:
+        yield [Document(page_content=text, metadata={"page": page}) for page, text in await future]
+
+
+async def temp_file_path(upload: UploadFile) -> tuple:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        path = tmp_file.name
+        while True:
+            chunk = await upload.read(1024 * 1024)
+            if not chunk:
+                break
+            tmp_file.write(chunk)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return await parse(stream_pdf_pages(path, source="bench.pdf"))
+    finally:
+        os.unlink(path)
+
+
+async def buffered_path(upload: UploadFile, spool_bytes: int) -> tuple:
+    buffer = await receive_upload(upload, max_bytes=1 << 40, spool_bytes=spool_bytes)
+    try:
+        buffer.sha256
+        return await parse(stream_pdf_pages(buffer.source, source="bench.pdf"))
+    finally:
+        buffer.discard()
+
+
+async def bytes_per_task(upload: UploadFile) -> tuple:
+    buffer = await receive_upload(upload, max_bytes=1 << 40, spool_bytes=1 << 40)
+    try:
+        buffer.sha256
+        return await parse(pages_sent_per_task(buffer.source))
+    finally:
+        buffer.discard()
+
+
+async def measure(variant, data: bytes, runs: int) -> tuple:
+    firsts, totals = [], []
+    loop = asyncio.get_running_loop()
+    for _ in range(runs):
+        # Let page ranges left over from the previous run finish first
+        await loop.run_in_executor(get_pdf_executor(), int)
+        upload = UploadFile(file=io.BytesIO(data), filename="bench.pdf", size=len(data))
+        started = time.perf_counter()
+        first, parsed = await variant(upload)
+        total = time.perf_counter() - started
+        totals.append(total * 1000)
+        firsts.append((total - parsed + first) * 1000)
+    return firsts, totals
+
+
+async def main_async(args) -> None:
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.pdf")
+        make_pdf(path, args.pages, filler_mb=args.filler_mb)
+    with open(path, "rb") as f:
+        data = f.read()
+    spool_bytes = int(args.spool_mb * 1024 * 1024)
+    # Start the worker pool outside the measurements
+    await parse(stream_pdf_pages(path, source="warmup.pdf"))
+
+    size_mb = len(data) / 1024 / 1024
+    pages = count_pages(data)
+    ranges = math.ceil(pages / max(PDF_PAGES_PER_TASK, math.ceil(pages / (PDF_PARSE_WORKERS * 4))))
+    print(f"{path}: {size_mb:.1f} MB, {pages} pages, {args.runs} runs, spool above {args.spool_mb:g} MB")
+    print(
+        f"{PDF_PARSE_WORKERS} workers, {ranges} page ranges: bytes per task pickles "
+        f"{size_mb * (ranges + 1):.0f} MB to the workers per upload, shared memory copies {size_mb:.0f} MB once"
+    )
+    variants = {
+        "temp file + fsync": temp_file_path,
+        "bytes per task": bytes_per_task,
+        "in-memory buffer": lambda upload: buffered_path(upload, spool_bytes),
+    }
+    for name, variant in variants.items():
+        firsts, totals = await measure(variant, data, args.runs)
+        print(
+            f"{name:>18}: first chunks median {statistics.median(firsts):7.1f} ms, "
+            f"all pages median {statistics.median(totals):7.1f} ms  min {min(totals):7.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--filler-mb", type=float, default=12)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--spool-mb", type=float, default=16)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Search latency of the local vector backend as the corpus grows.
+
+Fills a temporary LocalVectorBackend with random unit vectors for each
+corpus size and reports single-query p50/p99, the per-query cost of a
+batched `search_many`, and (when hnswlib is installed) HNSW latency and
+recall@k against exact search.
+
+    python bench_vector_index.py [--sizes 1000,10000,50000] [--dim 1536] [--queries 200]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import vector_backends
+from vector_backends import LocalVectorBackend
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def fill(backend: LocalVectorBackend, vectors: np.ndarray, batch: int = 1000) -> None:
+    for start in range(0, len(vectors), batch):
+        backend.upsert([
+            {"id": f"c{i}", "values": vectors[i], "metadata": {"text": f"chunk {i}", "id": f"c{i}"}}
+            for i in range(start, min(start + batch, len(vectors)))
+        ])
+
+
+def time_searches(backend: LocalVectorBackend, queries: np.ndarray, k: int):
+    timings = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([doc.id for doc, _score in backend.search(query, k)])
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    print(f"dim={args.dim} k={args.k} queries={args.queries} hnswlib={'yes' if vector_backends.hnswlib else 'no'}")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as path:
+            exact = LocalVectorBackend(path, args.dim, hnsw_threshold=size + 1)
+            started = time.perf_counter()
+            fill(exact, vectors)
+            build_s = time.perf_counter() - started
+
+            timings, exact_results = time_searches(exact, queries, args.k)
+            started = time.perf_counter()
+            exact.search_many(queries, args.k)
+            batched_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+            started = time.perf_counter()
+            LocalVectorBackend(path, args.dim, hnsw_threshold=size + 1).count()
+            reopen_ms = (time.perf_counter() - started) * 1000
+
+            line = (
+                f"{size:>8} vectors  fill {build_s:6.2f}s  reopen {reopen_ms:6.1f}ms  "
+                f"exact p50 {percentile(timings, 0.5):6.2f}ms p99 {percentile(timings, 0.99):6.2f}ms  "
+                f"batched {batched_ms:6.2f}ms/query"
+            )
+
+            if vector_backends.hnswlib is not None:
+                ann = LocalVectorBackend(path, args.dim, hnsw_threshold=1)
+                started = time.perf_counter()
+                ann.search(queries[0], args.k)  # builds the graph
+                graph_s = time.perf_counter() - started
+                ann_timings, ann_results = time_searches(ann, queries, args.k)
+                recall = np.mean([len(set(a) & set(e)) / args.k for a, e in zip(ann_results, exact_results)])
+                line += (
+                    f"  hnsw build {graph_s:5.1f}s p50 {percentile(ann_timings, 0.5):6.2f}ms "
+                    f"recall@{args.k} {recall:.2f}"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+from typing import List, Optional
+from langchain_core.documents import Document
+
+
+def parse_chunk_id(chunk_id: str):
+    """Split a `source:page:idx` chunk id into its parts"""
+    source, page, idx = chunk_id.rsplit(":", 2)
+    try:
+        page = int(page)
+    except ValueError:
+        page = -1
+    return source, page, int(idx)
+
+
+SCHEMA_VERSION = 2
+
+
+class ChunkStore:
+    """
+    Local SQLite copy of the chunks of each namespace's indexed document,
+    keyed by (namespace, `source:page:idx` chunk id). Lets generation
+    endpoints read document context without an embedding call or a
+    Pinecone round trip.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Derived data only: an old layout is dropped and rebuilt by the next upload
+            self._conn.execute("DROP TABLE IF EXISTS chunks")
+            self._conn.execute("DROP TABLE IF EXISTS meta")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                idx INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                PRIMARY KEY (namespace, id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_page ON chunks (namespace, source, page, idx)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+
+    def add_chunks(self, chunks: List[Document], namespace: str = "") -> None:
+        """Insert or replace chunks that already carry an `id` in their metadata"""
+        rows = []
+        for chunk in chunks:
+            source, page, idx = parse_chunk_id(chunk.metadata["id"])
+            rows.append((
+                namespace,
+                chunk.metadata["id"],
+                source,
+                page,
+                idx,
+                chunk.page_content,
+                chunk.metadata.get("content_hash", ""),
+                json.dumps(chunk.metadata, default=str),
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (namespace, id, source, page, idx, text, content_hash, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_content_hashes(self, namespace: str = "") -> dict:
+        """Map of chunk id -> content hash for everything stored in `namespace`"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT id, content_hash FROM chunks WHERE namespace = ?", (namespace,)
+            ).fetchall())
+
+    def delete_chunks(self, ids: List[str], namespace: str = "") -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE namespace = ? AND id = ?", [(namespace, i) for i in ids]
+            )
+
+    def get_meta(self, key: str, namespace: str = "") -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str, namespace: str = "") -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (namespace, key, value) VALUES (?, ?, ?)", (namespace, key, value)
+            )
+
+    def get_chunks(
+        self,
+        source: Optional[str] = None,
+        page_start: Optional[int] = None,
+        page_end: Optional[int] = None,
+        namespace: str = "",
+    ) -> List[Document]:
+        """Return chunks in document order, optionally limited to a source and inclusive page range"""
+        clauses = ["namespace = ?"]
+        params = [namespace]
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        if page_start is not None:
+            clauses.append("page >= ?")
+            params.append(page_start)
+        if page_end is not None:
+            clauses.append("page <= ?")
+            params.append(page_end)
+        where = f"WHERE {' AND '.join(clauses)}"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT text, metadata FROM chunks {where} ORDER BY source, page, idx",
+                params,
+            ).fetchall()
+        return [Document(page_content=text, metadata=json.loads(metadata)) for text, metadata in rows]
+
+    def count(self, namespace: str = "") -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def clear(self, namespace: str = "") -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+            self._conn.execute("DELETE FROM meta WHERE namespace = ?", (namespace,))
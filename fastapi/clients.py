@@ -0,0 +1,113 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+
+
+class ClientRegistry:
+    """
+    Process-wide OpenAI and Pinecone clients. Chat models are cached per
+    (model, temperature) and all of them share one keep-alive httpx pool
+    (sync and async), so steady-state requests reuse open TLS connections.
+    Pinecone index handles are cached per index name.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        pinecone_pool_threads: int = PINECONE_POOL_THREADS,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.pinecone_pool_threads = pinecone_pool_threads
+        self._lock = threading.Lock()
+        self._http_client = None
+        self._http_async_client = None
+        self._chat_models = {}
+        self._embeddings = {}
+        self._pinecone = None
+        self._indexes = {}
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+            return self._http_client
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            return self._http_async_client
+
+    def chat_model(self, model: str = "gpt-4o", temperature: Optional[float] = None):
+        key = (model, temperature)
+        if key not in self._chat_models:
+            from langchain_openai import ChatOpenAI
+            kwargs = {"temperature": temperature} if temperature is not None else {}
+            instance = ChatOpenAI(
+                model=model,
+                http_client=self.http_client(),
+                http_async_client=self.http_async_client(),
+                # Report token usage on streamed responses too (for /metrics)
+                stream_usage=True,
+                **kwargs,
+            )
+            with self._lock:
+                self._chat_models.setdefault(key, instance)
+        return self._chat_models[key]
+
+    def embeddings(self, model: str, dimensions: int):
+        key = (model, dimensions)
+        if key not in self._embeddings:
+            from langchain_openai import OpenAIEmbeddings
+            instance = OpenAIEmbeddings(
+                model=model,
+                dimensions=dimensions,
+                http_client=self.http_client(),
+                http_async_client=self.http_async_client(),
+            )
+            with self._lock:
+                self._embeddings.setdefault(key, instance)
+        return self._embeddings[key]
+
+    def pinecone(self):
+        with self._lock:
+            if self._pinecone is None:
+                from pinecone import Pinecone
+                self._pinecone = Pinecone(
+                    api_key=os.environ["PINECONE_API_KEY"],
+                    pool_threads=self.pinecone_pool_threads,
+                )
+            return self._pinecone
+
+    def index(self, name: str):
+        client = self.pinecone()
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = client.Index(
+                    name,
+                    pool_threads=self.pinecone_pool_threads,
+                    connection_pool_maxsize=self.limits.max_connections,
+                )
+            return self._indexes[name]
+
+    async def aclose(self) -> None:
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
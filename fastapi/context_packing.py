@@ -0,0 +1,148 @@
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from chunk_store import parse_chunk_id
+from keyword_index import tokenize
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Seconds to wait before trying to load the encoding again after a failure
+ENCODING_RETRY_SECONDS = 60.0
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_retry_at = 0.0
+
+
+def count_tokens(text: str) -> int:
+    """
+    gpt-4o token count via tiktoken's o200k_base encoding. tiktoken downloads
+    the encoding on first use; while that fails (no network) this falls back
+    to ~4 characters per token and tries again every ENCODING_RETRY_SECONDS.
+    """
+    global _encoding, _encoding_retry_at
+    if _encoding is None and time.monotonic() >= _encoding_retry_at:
+        with _encoding_lock:
+            if _encoding is None and time.monotonic() >= _encoding_retry_at:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"Warning: tiktoken unavailable ({e}), estimating token counts")
+                    _encoding_retry_at = time.monotonic() + ENCODING_RETRY_SECONDS
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def strip_overlap(previous: str, text: str, min_overlap: int = 16, max_overlap: int = 400) -> str:
+    """Drop the prefix of `text` that repeats the end of `previous` (text splitter overlap)"""
+    longest = min(len(previous), len(text), max_overlap)
+    for size in range(longest, min_overlap - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+
+def lexical_score(query_terms: set, text: str) -> float:
+    """Fraction of distinct query terms that occur in `text`"""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+def _normalize(values: List[float]) -> List[float]:
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return [1.0] * len(values)
+    return [(v - low) / (high - low) for v in values]
+
+
+def _position(doc: Document, fallback: int) -> Tuple[str, int, int]:
+    chunk_id = doc.metadata.get("id")
+    return parse_chunk_id(chunk_id) if chunk_id else ("", -1, fallback)
+
+
+def rerank(
+    query_text: str,
+    docs: Sequence[Document],
+    vector_scores: Dict[str, float],
+    lexical_weight: float = 0.3,
+) -> List[Document]:
+    """
+    Order candidates by a blend of query-term coverage and vector similarity
+    (each min-max normalized over the candidates). Candidates the vector
+    search did not return get the lowest vector score seen.
+    """
+    if not docs:
+        return []
+    query_terms = set(tokenize(query_text))
+    floor = min(vector_scores.values(), default=0.0)
+    lexical = _normalize([lexical_score(query_terms, d.page_content) for d in docs])
+    vector = _normalize([vector_scores.get(d.metadata.get("id"), floor) for d in docs])
+    scores = [lexical_weight * l + (1 - lexical_weight) * v for l, v in zip(lexical, vector)]
+    order = sorted(range(len(docs)), key=lambda i: -scores[i])
+    return [docs[i] for i in order]
+
+
+def merge_adjacent(docs: Sequence[Document]) -> List[Tuple[List[Document], str]]:
+    """
+    Group chunks that are consecutive on the same page into one passage,
+    stripping the splitter overlap between them. Returns (chunks, text)
+    pairs in document order.
+    """
+    positioned = sorted((_position(doc, i), doc) for i, doc in enumerate(docs))
+    passages = []
+    last = None
+    for position, doc in positioned:
+        if last is not None and position[:2] == last[:2] and position[2] == last[2] + 1:
+            chunks, text = passages[-1]
+            passages[-1] = (chunks + [doc], text + " " + strip_overlap(text, doc.page_content))
+        else:
+            passages.append(([doc], doc.page_content))
+        last = position
+    return passages
+
+
+def pack_context(
+    query_text: str,
+    candidates: Sequence[Document],
+    vector_scores: Dict[str, float],
+    token_budget: int,
+    max_chunks: int,
+    lexical_weight: float = 0.3,
+) -> dict:
+    """
+    Build the /query context: rerank the retrieved candidates, take the best
+    ones until `max_chunks` or `token_budget` is reached, merge neighbouring
+    chunks without their overlap and join the passages in document order.
+
+    Returns the context text, the ids of the chunks it contains, its token
+    count and the token count of the unpacked baseline (the top `max_chunks`
+    candidates joined as-is).
+    """
+    candidates = list(candidates)
+    baseline = CONTEXT_SEPARATOR.join(d.page_content for d in candidates[:max_chunks])
+
+    selected = []
+    used = 0
+    for doc in rerank(query_text, candidates, vector_scores, lexical_weight):
+        if len(selected) >= max_chunks:
+            break
+        cost = count_tokens(doc.page_content)
+        if used + cost > token_budget and selected:
+            continue
+        selected.append(doc)
+        used += cost
+
+    passages = merge_adjacent(selected)
+    context = CONTEXT_SEPARATOR.join(text for _chunks, text in passages)
+    return {
+        "context": context,
+        "sources": [doc.metadata.get("id") for chunks, _text in passages for doc in chunks],
+        "context_tokens": count_tokens(context) if context else 0,
+        "baseline_tokens": count_tokens(baseline) if baseline else 0,
+    }
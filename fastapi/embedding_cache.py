@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from scheduler import INTERACTIVE, Scheduler
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed cache in front of an embeddings model. Vectors are stored as
+    float32 blobs in SQLite keyed by sha256(model, dimensions, text), so
+    repeated chunks and repeated queries never reach the API. Least recently
+    used vectors are evicted once the store grows past `max_bytes`.
+
+    Hits only record their `last_used` time in memory; the timestamps are
+    written in one transaction with the next store, or once
+    `touch_flush_entries` accumulate or `touch_flush_seconds` pass. The
+    async methods run all SQLite work in a thread.
+
+    With a `scheduler`, the async methods send cache misses to the model
+    through it at the caller's priority, charging `estimate_tokens` of the
+    missed texts only; hits never wait for a slot or count against the quota.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        touch_flush_entries: int = 1024,
+        touch_flush_seconds: float = 30.0,
+        scheduler: Optional[Scheduler] = None,
+        estimate_tokens: Callable[[str], int] = lambda text: len(text) // 4 + 1,
+    ):
+        self.underlying = underlying
+        self.scheduler = scheduler
+        self.estimate_tokens = estimate_tokens
+        self.namespace = f"{getattr(underlying, 'model', '')}:{getattr(underlying, 'dimensions', '')}"
+        self.max_bytes = max_bytes
+        self.touch_flush_entries = touch_flush_entries
+        self.touch_flush_seconds = touch_flush_seconds
+        self._touched = {}
+        self._touched_since = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_by_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts: List[str]):
+        """Return (vectors with None for misses, keys)"""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(keys))
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._touched.update((k, now) for k in found)
+                if (
+                    len(self._touched) >= self.touch_flush_entries
+                    or time.monotonic() - self._touched_since >= self.touch_flush_seconds
+                ):
+                    with self._conn:
+                        self._flush_touched()
+        vectors = [np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None for k in keys]
+        hits = sum(v is not None for v in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors, keys
+
+    def _flush_touched(self) -> None:
+        """Write the pending hit timestamps; call with the lock held, inside a transaction"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched = {}
+        self._touched_since = time.monotonic()
+
+    def flush(self) -> None:
+        """Persist pending hit timestamps (e.g. at shutdown)"""
+        with self._lock, self._conn:
+            self._flush_touched()
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> None:
+        now = time.time()
+        rows = {k: np.asarray(v, dtype=np.float32).tobytes() for k, v in zip(keys, vectors)}
+        with self._lock, self._conn:
+            # Before eviction, so recently hit vectors are not taken for cold ones
+            self._flush_touched()
+            for key, blob in rows.items():
+                old = self._conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", (key, blob, now)
+                )
+                self._bytes += len(blob) - (old[0] if old else 0)
+            while self._bytes > self.max_bytes:
+                victims = self._conn.execute(
+                    "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 256"
+                ).fetchall()
+                if not victims:
+                    self._bytes = 0
+                    break
+                evicted = []
+                for key, size in victims:
+                    if self._bytes <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    self._bytes -= size
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def _fill(self, texts, vectors, keys, computed) -> List[List[float]]:
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self._store([keys[i] for i in missing], computed)
+        for i, vector in zip(missing, computed):
+            vectors[i] = list(vector)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, keys = self._lookup(texts)
+        missing = [texts[i] for i, v in enumerate(vectors) if v is None]
+        computed = self.underlying.embed_documents(missing) if missing else []
+        return self._fill(texts, vectors, keys, computed)
+
+    async def _compute(self, make_call, texts: List[str], priority: int):
+        if self.scheduler is None:
+            return await make_call()
+        tokens = sum(self.estimate_tokens(t) for t in texts)
+        return await self.scheduler.run(make_call, priority, tokens)
+
+    async def aembed_documents(self, texts: List[str], priority: int = INTERACTIVE) -> List[List[float]]:
+        vectors, keys = await asyncio.to_thread(self._lookup, texts)
+        missing = [texts[i] for i, v in enumerate(vectors) if v is None]
+        if not missing:
+            return vectors
+        computed = await self._compute(lambda: self.underlying.aembed_documents(missing), missing, priority)
+        return await asyncio.to_thread(self._fill, texts, vectors, keys, computed)
+
+    def embed_query(self, text: str) -> List[float]:
+        vectors, keys = self._lookup([text])
+        if vectors[0] is not None:
+            return vectors[0]
+        return self._fill([text], vectors, keys, [self.underlying.embed_query(text)])[0]
+
+    async def aembed_query(self, text: str, priority: int = INTERACTIVE) -> List[float]:
+        vectors, keys = await asyncio.to_thread(self._lookup, [text])
+        if vectors[0] is not None:
+            return vectors[0]
+        computed = [await self._compute(lambda: self.underlying.aembed_query(text), [text], priority)]
+        return (await asyncio.to_thread(self._fill, [text], vectors, keys, computed))[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_stored": self._bytes,
+            "pending_touches": len(self._touched),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,177 @@
+"""
+Bulk-ingest a directory of PDFs into one namespace of the vector index.
+
+Files are processed INGEST_FILES_CONCURRENCY at a time: pages are parsed on
+the shared PDF process pool, split and chunk-ided exactly like uploads, and
+embedded and upserted through the same batched, concurrent pipeline. Each
+finished file is appended to a checkpoint manifest (JSON lines), so an
+interrupted run resumes without re-embedding finished files; files whose
+content changed since they were recorded are re-ingested, embedding only
+the chunks whose text changed and deleting chunks that disappeared.
+
+Chunk sources are paths relative to the directory, so they stay stable
+across runs and machines. A running API server picks the new chunks up
+for keyword search after a restart.
+
+The namespace must be a dedicated one: per-user namespaces (user-*) are
+replaced wholesale by that user's next upload. The API serves requests
+without a signed-in user from SHARED_NAMESPACE (default "library").
+
+    python ingest.py DIRECTORY --namespace NS [--manifest PATH] [--concurrency N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List
+
+import app
+from chunk_store import parse_chunk_id
+from pdf_loader import stream_pdf_pages
+
+INGEST_FILES_CONCURRENCY = int(os.getenv("INGEST_FILES_CONCURRENCY", "4"))
+
+
+def find_pdfs(directory: str) -> List[str]:
+    """Relative paths of every PDF under `directory`, in a stable order"""
+    paths = []
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(paths)
+
+
+def load_manifest(path: str) -> Dict[str, dict]:
+    """Finished files by relative path; a torn last line from a crash is ignored"""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["path"]] = entry
+    return entries
+
+
+def indexed_by_source(namespace: str) -> Dict[str, Dict[str, str]]:
+    """{source: {chunk id: content hash}} for everything already stored in `namespace`"""
+    grouped = {}
+    for chunk_id, content_hash in app.chunk_store.get_content_hashes(namespace).items():
+        grouped.setdefault(parse_chunk_id(chunk_id)[0], {})[chunk_id] = content_hash
+    return grouped
+
+
+async def ingest_file(directory: str, relative_path: str, namespace: str, indexed: Dict[str, str]) -> dict:
+    """Index one PDF; returns its manifest entry"""
+    file_path = os.path.join(directory, relative_path)
+    file_hash = await asyncio.to_thread(app.hash_file, file_path)
+
+    chunks = []
+    changed = []
+
+    async def changed_ranges():
+        async for pages in stream_pdf_pages(file_path, source=relative_path):
+            page_chunks = app.calculate_chunk_ids(await asyncio.to_thread(app.split_documents, pages))
+            for chunk in page_chunks:
+                chunk.metadata["content_hash"] = app.hash_text(chunk.page_content)
+            page_changed = [c for c in page_chunks if indexed.get(c.metadata["id"]) != c.metadata["content_hash"]]
+            chunks.extend(page_chunks)
+            changed.extend(page_changed)
+            if page_changed:
+                yield page_changed
+
+    # One pipeline per file, so embedding batches span page ranges
+    await app.add_to_pinecone(changed_ranges(), namespace=namespace)
+
+    current_ids = {c.metadata["id"] for c in chunks}
+    stale_ids = [i for i in indexed if i not in current_ids]
+    await app.delete_from_pinecone(stale_ids, namespace)
+    await asyncio.to_thread(app.chunk_store.delete_chunks, stale_ids, namespace)
+    await asyncio.to_thread(app.chunk_store.add_chunks, changed, namespace)
+    if indexed:
+        await asyncio.to_thread(
+            app.item_bank.discard_derived_from, namespace, [c.metadata["id"] for c in changed] + stale_ids
+        )
+    return {
+        "path": relative_path,
+        "sha256": file_hash,
+        "chunks": len(chunks),
+        "embedded": len(changed),
+        "deleted": len(stale_ids),
+    }
+
+
+async def ingest_directory(directory: str, namespace: str, manifest_path: str, concurrency: int) -> None:
+    manifest = load_manifest(manifest_path)
+    paths = find_pdfs(directory)
+    indexed = await asyncio.to_thread(indexed_by_source, namespace)
+    print(f"Found {len(paths)} PDFs, {len(manifest)} already in {manifest_path}")
+
+    slots = asyncio.Semaphore(concurrency)
+    totals = {"files": 0, "skipped": 0, "failed": 0, "chunks": 0, "embedded": 0}
+    started = time.perf_counter()
+
+    with open(manifest_path, "a") as manifest_file:
+        async def process(relative_path: str) -> None:
+            async with slots:
+                recorded = manifest.get(relative_path)
+                if recorded is not None:
+                    file_hash = await asyncio.to_thread(app.hash_file, os.path.join(directory, relative_path))
+                    if file_hash == recorded["sha256"]:
+                        totals["skipped"] += 1
+                        return
+                try:
+                    entry = await ingest_file(directory, relative_path, namespace, indexed.get(relative_path, {}))
+                except Exception as e:
+                    totals["failed"] += 1
+                    print(f"FAILED {relative_path}: {getattr(e, 'detail', e)}")
+                    return
+                manifest_file.write(json.dumps(entry) + "\n")
+                manifest_file.flush()
+                totals["files"] += 1
+                totals["chunks"] += entry["chunks"]
+                totals["embedded"] += entry["embedded"]
+                elapsed = time.perf_counter() - started
+                print(
+                    f"[{totals['files'] + totals['skipped'] + totals['failed']}/{len(paths)}] {relative_path}: "
+                    f"{entry['chunks']} chunks ({entry['embedded']} embedded) - "
+                    f"{totals['files'] / elapsed:.2f} files/s, {totals['chunks'] / elapsed:.1f} chunks/s"
+                )
+
+        await asyncio.gather(*(process(p) for p in paths))
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Ingested {totals['files']} files ({totals['chunks']} chunks, {totals['embedded']} embedded) in "
+        f"{elapsed:.1f}s: {totals['files'] / elapsed:.2f} files/s, {totals['chunks'] / elapsed:.1f} chunks/s; "
+        f"skipped {totals['skipped']} unchanged, {totals['failed']} failed"
+    )
+
+
+async def main_async(args) -> None:
+    try:
+        await ingest_directory(args.directory, args.namespace, args.manifest, args.concurrency)
+    finally:
+        await app.clients.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--namespace", required=True, help="dedicated vector index namespace, e.g. library")
+    parser.add_argument("--manifest", help="checkpoint file (default: DIRECTORY/.ingest-manifest.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=INGEST_FILES_CONCURRENCY, help="files processed at once")
+    args = parser.parse_args()
+    if not app.USER_ID_PATTERN.fullmatch(args.namespace) or args.namespace.startswith("user-"):
+        parser.error("--namespace must be letters, digits, '_' or '-' and must not start with 'user-'")
+    args.manifest = args.manifest or os.path.join(args.directory, ".ingest-manifest.jsonl")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+
+
+class ItemBank:
+    """
+    Local SQLite bank of pre-generated flashcards and quiz questions, per
+    namespace, kind and difficulty. Every item keeps the ids of the chunks
+    it was generated from, so re-uploading a document only discards items
+    derived from chunks that changed. Draws are random and consume the
+    items they return.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                namespace TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question TEXT NOT NULL,
+                item TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                PRIMARY KEY (namespace, kind, difficulty, question)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS item_sources (namespace TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "kind TEXT NOT NULL, difficulty TEXT NOT NULL, question TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS item_sources_by_chunk ON item_sources (namespace, chunk_id)")
+        self._conn.commit()
+
+    def add(self, namespace: str, kind: str, difficulty: str, items: Iterable[dict], sources: List[str]) -> int:
+        """Store generated items (dicts with a `question`) derived from chunk ids `sources`; returns how many were new"""
+        added = 0
+        with self._lock, self._conn:
+            for item in items:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO items (namespace, kind, difficulty, question, item, sources) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, kind, difficulty, item["question"], json.dumps(item), json.dumps(sources)),
+                )
+                if cursor.rowcount:
+                    added += 1
+                    self._conn.executemany(
+                        "INSERT INTO item_sources (namespace, chunk_id, kind, difficulty, question) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(namespace, chunk_id, kind, difficulty, item["question"]) for chunk_id in sources],
+                    )
+        return added
+
+    def draw(self, namespace: str, kind: str, difficulty: str, count: int) -> Optional[dict]:
+        """
+        Remove and return `count` random items as {"items", "sources"}, or
+        None (leaving the bank untouched) when fewer than `count` remain.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT question, item, sources FROM items WHERE namespace = ? AND kind = ? AND difficulty = ? "
+                "ORDER BY RANDOM() LIMIT ?",
+                (namespace, kind, difficulty, count),
+            ).fetchall()
+            if len(rows) < count:
+                return None
+            self._delete(namespace, kind, difficulty, [question for question, _item, _sources in rows])
+        sources = []
+        for _question, _item, item_sources in rows:
+            sources.extend(s for s in json.loads(item_sources) if s not in sources)
+        return {"items": [json.loads(item) for _question, item, _sources in rows], "sources": sources}
+
+    def _delete(self, namespace: str, kind: str, difficulty: str, questions: List[str]) -> None:
+        params = [(namespace, kind, difficulty, q) for q in questions]
+        self._conn.executemany(
+            "DELETE FROM items WHERE namespace = ? AND kind = ? AND difficulty = ? AND question = ?", params
+        )
+        self._conn.executemany(
+            "DELETE FROM item_sources WHERE namespace = ? AND kind = ? AND difficulty = ? AND question = ?", params
+        )
+
+    def count(self, namespace: str, kind: str, difficulty: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM items WHERE namespace = ? AND kind = ? AND difficulty = ?",
+                (namespace, kind, difficulty),
+            ).fetchone()[0]
+
+    def discard_derived_from(self, namespace: str, chunk_ids: Iterable[str]) -> int:
+        """Drop every item generated from any of `chunk_ids`; returns how many were dropped"""
+        chunk_ids = list(chunk_ids)
+        with self._lock, self._conn:
+            stale = set()
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                stale.update(self._conn.execute(
+                    f"SELECT kind, difficulty, question FROM item_sources "
+                    f"WHERE namespace = ? AND chunk_id IN ({placeholders})",
+                    [namespace, *batch],
+                ).fetchall())
+            for kind, difficulty, question in stale:
+                self._delete(namespace, kind, difficulty, [question])
+        return len(stale)
+
+    def clear(self, namespace: str = "") -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM items WHERE namespace = ?", (namespace,))
+            self._conn.execute("DELETE FROM item_sources WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall()
+        return dict(rows)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+
+class IngestionJob(BaseModel):
+    job_id: str
+    filename: str
+    namespace: str = ""
+    stage: str = "queued"  # queued, parsing, embedding, verifying, generating, completed, failed
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    error: Optional[str] = None
+    warning: Optional[str] = None  # e.g. the new vectors were not confirmed queryable in time
+    created_at: float
+    finished_at: Optional[float] = None
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on the event loop with at most `max_workers` in
+    progress at once, and keeps the most recent `max_jobs` for polling.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 200):
+        self.max_jobs = max_jobs
+        self._slots = asyncio.Semaphore(max_workers)
+        self._jobs = OrderedDict()
+        self._tasks = set()
+
+    def submit(
+        self, filename: str, work: Callable[[IngestionJob], Awaitable[object]], namespace: str = ""
+    ) -> IngestionJob:
+        job = IngestionJob(job_id=uuid.uuid4().hex, filename=filename, namespace=namespace, created_at=time.time())
+        self._jobs[job.job_id] = job
+        self._prune()
+        task = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: IngestionJob, work) -> None:
+        async with self._slots:
+            try:
+                await work(job)
+                job.stage = "completed"
+            except HTTPException as e:
+                job.stage = "failed"
+                job.error = str(e.detail)
+            except Exception as e:
+                traceback.print_exc()
+                job.stage = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((k for k, j in self._jobs.items() if j.finished_at is not None), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
@@ -0,0 +1,63 @@
+import json
+from typing import List
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally extract objects from a top-level JSON array as its text is
+    streamed in. Anything before the opening `[` (e.g. a ```json fence) is
+    skipped, and each `{...}` element is decoded as soon as it closes, so a
+    malformed element only costs that element. Once the array's closing `]`
+    arrives the rest of the text (e.g. a note after the JSON) is ignored.
+    """
+
+    def __init__(self):
+        self.invalid = 0
+        self._started = False
+        self.closed = False
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[object]:
+        """Consume the next piece of text and return the elements completed by it"""
+        items = []
+        for ch in text:
+            if self.closed:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == "]":
+                    self.closed = True
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError:
+                        self.invalid += 1
+                    self._buffer = []
+        return items
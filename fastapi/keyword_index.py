@@ -0,0 +1,215 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# Keep symbols that carry meaning in lecture notes (C++, O(n), x^2, H2O, t-test)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[+#^'.\-][a-z0-9+#]+)*\+*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when "
+    "where which who why will with how do does did".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens with stopwords removed"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _Namespace:
+    def __init__(self):
+        self.docs: Dict[str, Document] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+
+class _Load:
+    """A namespace being read through the loader; `stale` if it was written to meanwhile"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stale = False
+
+
+class KeywordIndex:
+    """
+    In-memory BM25 inverted index over chunk text, one per namespace.
+
+    Postings map each term to {chunk id: term frequency}, so a search only
+    touches the chunks that contain a query term. Namespaces that this
+    process has not indexed yet are loaded on first search through `loader`
+    (e.g. from the chunk store), so a fresh instance still answers keyword
+    queries for documents another instance ingested.
+
+    With a loader, at most `max_namespaces` are kept in memory and the least
+    recently searched is dropped beyond that; the loader is the source of
+    truth, so writes to a namespace that is not in memory are skipped. Loads
+    run outside the index lock, and a load that raced with a write to its
+    namespace answers the search that triggered it but is not kept.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], List[Document]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_namespaces: int = 64,
+    ):
+        self.loader = loader
+        self.k1 = k1
+        self.b = b
+        self.max_namespaces = max_namespaces
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._namespaces: "OrderedDict[str, _Namespace]" = OrderedDict()
+        self._loading: Dict[str, _Load] = {}
+
+    def _insert(self, namespace: str, ns: _Namespace) -> _Namespace:
+        self._namespaces[namespace] = ns
+        self._namespaces.move_to_end(namespace)
+        if self.loader is not None:
+            while len(self._namespaces) > max(self.max_namespaces, 1):
+                self._namespaces.popitem(last=False)
+                self.evictions += 1
+        return ns
+
+    def _for_write(self, namespace: str) -> Optional[_Namespace]:
+        """The in-memory namespace to update, or None if the loader will supply it; lock held"""
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            load = self._loading.get(namespace)
+            if load is not None:
+                load.stale = True
+            if self.loader is None:
+                ns = self._insert(namespace, _Namespace())
+        return ns
+
+    def _get(self, namespace: str) -> _Namespace:
+        """The namespace to search, loading it without holding the lock on a miss"""
+        while True:
+            with self._lock:
+                ns = self._namespaces.get(namespace)
+                if ns is not None:
+                    self._namespaces.move_to_end(namespace)
+                    return ns
+                if self.loader is None:
+                    return self._insert(namespace, _Namespace())
+                load = self._loading.get(namespace)
+                if load is None:
+                    load = self._loading[namespace] = _Load()
+                    break
+            # Another thread is loading this namespace; use its result (or retry if it failed)
+            load.done.wait()
+
+        ns = _Namespace()
+        loaded = False
+        try:
+            self._add(ns, self.loader(namespace))
+            loaded = True
+        finally:
+            with self._lock:
+                del self._loading[namespace]
+                if loaded and not load.stale:
+                    self._insert(namespace, ns)
+            load.done.set()
+        return ns
+
+    def _add(self, ns: _Namespace, chunks: Iterable[Document]) -> None:
+        for chunk in chunks:
+            chunk_id = chunk.metadata["id"]
+            self._remove(ns, [chunk_id])
+            terms = Counter(tokenize(chunk.page_content))
+            ns.docs[chunk_id] = chunk
+            ns.lengths[chunk_id] = sum(terms.values())
+            ns.total_length += ns.lengths[chunk_id]
+            for term, tf in terms.items():
+                ns.postings.setdefault(term, {})[chunk_id] = tf
+
+    def _remove(self, ns: _Namespace, ids: Iterable[str]) -> None:
+        for chunk_id in ids:
+            chunk = ns.docs.pop(chunk_id, None)
+            if chunk is None:
+                continue
+            ns.total_length -= ns.lengths.pop(chunk_id)
+            for term in set(tokenize(chunk.page_content)):
+                postings = ns.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del ns.postings[term]
+
+    def add(self, chunks: Sequence[Document], namespace: str = "") -> None:
+        """Index chunks that carry an `id` in their metadata, replacing earlier versions"""
+        with self._lock:
+            ns = self._for_write(namespace)
+            if ns is not None:
+                self._add(ns, chunks)
+
+    def remove(self, ids: Sequence[str], namespace: str = "") -> None:
+        with self._lock:
+            ns = self._for_write(namespace)
+            if ns is not None:
+                self._remove(ns, ids)
+
+    def clear(self, namespace: str = "") -> None:
+        """Forget `namespace`; it is empty (or reloaded) until chunks are added again"""
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            load = self._loading.get(namespace)
+            if load is not None:
+                load.stale = True
+
+    def search(self, query: str, k: int = 5, namespace: str = "") -> List[Tuple[Document, float]]:
+        """Top `k` chunks by BM25 score; chunks sharing no term with the query are not returned"""
+        ns = self._get(namespace)
+        with self._lock:
+            n = len(ns.docs)
+            if not n:
+                return []
+            avg_length = ns.total_length / n or 1.0
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = ns.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * ns.lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [(ns.docs[chunk_id], score) for chunk_id, score in top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "namespaces": len(self._namespaces),
+                "max_namespaces": self.max_namespaces,
+                "evictions": self.evictions,
+                "loading": len(self._loading),
+                "chunks": sum(len(ns.docs) for ns in self._namespaces.values()),
+                "terms": sum(len(ns.postings) for ns in self._namespaces.values()),
+            }
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[Document, float]]], k: int = 5, rrf_k: int = 60
+) -> List[Tuple[Document, float]]:
+    """
+    Merge ranked result lists by reciprocal rank fusion: each chunk scores
+    sum(1 / (rrf_k + rank)) over the lists it appears in. Chunks are matched
+    by their `id` metadata; the first list's Document wins for duplicates.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (doc, _score) in enumerate(ranking, start=1):
+            key = doc.metadata.get("id") or doc.page_content
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return [(docs[key], score) for key, score in top]
@@ -0,0 +1,151 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds; covers sub-millisecond local stages up to long LLM generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Per-request stage durations, collected for Server-Timing headers
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: LabelKey = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _k, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _v), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry: counters and histograms with
+    labels, rendered in the Prometheus text exposition format. Collectors
+    registered with `register_gauges` are read at render time, so existing
+    stats (caches, queues) are exported without double bookkeeping.
+    """
+
+    def __init__(self, prefix: str = "neolearn", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List]] = {}
+        self._gauge_collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def _name(self, name: str) -> str:
+        return f"{self.prefix}_{name}"
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[self._name(name)] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(self._name(name), {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(self._name(name), {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time a block into `stage_duration_seconds{stage=...}` and the current request's timings"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - started, **labels)
+
+    def record_stage(self, stage: str, seconds: float, **labels) -> None:
+        self.observe("stage_duration_seconds", seconds, stage=stage, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def register_gauges(self, collector: Callable[[], Dict[str, float]]) -> None:
+        """`collector` returns {metric name (without prefix): value} when /metrics is scraped"""
+        self._gauge_collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+
+        def header(name: str, default_kind: str) -> None:
+            kind, help_text = self._help.get(name, (default_kind, ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for labels, (counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for collector in self._gauge_collectors:
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+                continue
+            for name, value in sorted(values.items()):
+                if value is None:
+                    continue
+                header(self._name(name), "gauge")
+                lines.append(f"{self._name(name)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def start_request_timings() -> contextvars.Token:
+    """Begin collecting stage timings for the current request; pass the token to `finish_request_timings`"""
+    return _request_timings.set({})
+
+
+def finish_request_timings(token: contextvars.Token) -> Dict[str, float]:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Format stage durations as a Server-Timing header value (milliseconds)"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+metrics = Metrics()
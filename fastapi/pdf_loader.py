@@ -0,0 +1,151 @@
+import asyncio
+import io
+import math
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import AsyncIterator, List, Tuple, Union
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from metrics import metrics
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+_executor = None
+
+
+def get_pdf_executor() -> Executor:
+    """Process pool for page extraction; falls back to threads where processes are unavailable"""
+    global _executor
+    if _executor is None:
+        try:
+            # Workers forked after this share the parent's tracker for SharedPdf
+            # segments instead of each starting one that unlinks them on exit
+            resource_tracker.ensure_running()
+            _executor = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+        except (OSError, NotImplementedError) as e:
+            print(f"Warning: process pool unavailable ({e}), parsing PDFs in threads")
+            _executor = ThreadPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+    return _executor
+
+
+class SharedPdf:
+    """
+    PDF bytes copied once into a shared memory segment. It pickles as the
+    segment's name, so sending it to a worker process does not copy the
+    file; each task maps the segment and reads the bytes from there.
+    """
+
+    def __init__(self, data: bytes):
+        self.size = len(data)
+        self._segment = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+        self._segment.buf[:self.size] = data
+        self.name = self._segment.name
+
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _segment=None)
+
+    def read(self) -> bytes:
+        segment = shared_memory.SharedMemory(name=self.name)
+        try:
+            return bytes(segment.buf[:self.size])
+        finally:
+            segment.close()
+
+    def release(self) -> None:
+        """Free the segment (owner only); tasks already reading keep their mapping"""
+        self._segment.close()
+        self._segment.unlink()
+
+
+def open_pdf(pdf: Union[str, bytes, SharedPdf]) -> PdfReader:
+    """`pdf` is a file path, the file's bytes or a SharedPdf"""
+    if isinstance(pdf, SharedPdf):
+        pdf = pdf.read()
+    return PdfReader(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+
+
+def count_pages(pdf: Union[str, bytes, SharedPdf]) -> int:
+    return len(open_pdf(pdf).pages)
+
+
+def extract_page_range(pdf: Union[str, bytes, SharedPdf], start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract text for pages [start, end); runs inside a worker process"""
+    reader = open_pdf(pdf)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+async def stream_pdf_pages(
+    file_path: Union[str, bytes], source: str = None, pages_per_task: int = None
+) -> AsyncIterator[List[Document]]:
+    """
+    Parse a PDF across the worker pool and yield one list of page Documents
+    per page range, in page order, as soon as that range is extracted.
+    Metadata matches PyPDFLoader: `source` and zero-based `page`.
+
+    `file_path` may also be the PDF's bytes (an upload held in memory), and
+    `source` is then required. The page count is read from them in a thread;
+    for a process pool they are placed in shared memory once instead of
+    being pickled to a worker with every task.
+
+    Every task re-opens the file, so by default ranges are sized to give each
+    worker about four tasks, but never fewer than PDF_PAGES_PER_TASK pages.
+    """
+    if source is None and isinstance(file_path, bytes):
+        raise ValueError("source is required when parsing PDF bytes")
+    executor = get_pdf_executor()
+    with metrics.timer("pdf_load"):
+        if isinstance(file_path, bytes):
+            total_pages = await asyncio.to_thread(count_pages, file_path)
+        else:
+            total_pages = await asyncio.wrap_future(executor.submit(count_pages, file_path))
+    source = source or file_path
+    if pages_per_task is None:
+        pages_per_task = max(PDF_PAGES_PER_TASK, math.ceil(total_pages / (PDF_PARSE_WORKERS * 4)))
+
+    shared = None
+    pdf = file_path
+    if isinstance(file_path, bytes) and isinstance(executor, ProcessPoolExecutor) and total_pages > 0:
+        shared = pdf = SharedPdf(file_path)
+    futures = []
+    try:
+        for start in range(0, total_pages, pages_per_task):
+            futures.append(executor.submit(extract_page_range, pdf, start, min(start + pages_per_task, total_pages)))
+        for future in futures:
+            # Time spent waiting on the pool, i.e. parsing the pipeline could not overlap
+            with metrics.timer("pdf_load"):
+                pages = await asyncio.wrap_future(future)
+            metrics.inc("pdf_pages_total", len(pages))
+            yield [
+                Document(page_content=text, metadata={"source": source, "page": page, "total_pages": total_pages})
+                for page, text in pages
+            ]
+    finally:
+        # cancel() fails for ranges a worker already started
+        started = [future for future in futures if not future.cancel() and not future.done()]
+        if shared is not None:
+            release_when_done(shared, started)
+
+
+def release_when_done(shared: SharedPdf, futures: List[Future]) -> None:
+    """Free `shared` once the tasks that may still read it have finished"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(_future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shared.release()
+
+    if not futures:
+        shared.release()
+    for future in futures:
+        future.add_done_callback(finished)
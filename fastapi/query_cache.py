@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+class QueryCache:
+    """
+    Two-level answer cache for /query, partitioned by namespace.
+
+    The exact level is keyed on (namespace, normalized query, document
+    version). The semantic level reuses an answer from the same namespace
+    when the cosine similarity between the new query embedding and a cached
+    one is at least `similarity_threshold`. Both levels expire entries after
+    `ttl_seconds` and evict least recently used entries beyond `max_entries`.
+    `invalidate(namespace)` bumps that namespace's document version so
+    nothing cached for its old document can be served again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self._epoch = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()
+        self._semantic = OrderedDict()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def version(self, namespace: str = "") -> tuple:
+        """Current document version of `namespace`; pass it back to `put`"""
+        return (self._epoch, self._versions.get(namespace, 0))
+
+    def get_exact(self, query: str, namespace: str = "") -> Optional[dict]:
+        key = (namespace, normalize_query(query), self.version(namespace))
+        now = self.clock()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None or entry[0] <= now:
+                self._exact.pop(key, None)
+                return None
+            self._exact.move_to_end(key)
+            self._counters["exact_hits"] += 1
+            return entry[1]
+
+    def get_semantic(self, embedding: List[float], namespace: str = "") -> Optional[dict]:
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, entry in self._semantic.items() if entry[0] <= now]:
+                del self._semantic[key]
+            keys = [k for k in self._semantic if k[0] == namespace]
+            if not keys:
+                self._counters["misses"] += 1
+                return None
+            matrix = np.stack([self._semantic[k][1] for k in keys])
+            scores = matrix @ _unit(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self._counters["misses"] += 1
+                return None
+            self._semantic.move_to_end(keys[best])
+            self._counters["semantic_hits"] += 1
+            return self._semantic[keys[best]][2]
+
+    def put(
+        self, query: str, embedding: Optional[List[float]], value: dict, version: tuple, namespace: str = ""
+    ) -> None:
+        """Store an answer computed against document `version`; stale versions are dropped"""
+        expires = self.clock() + self.ttl_seconds
+        norm = normalize_query(query)
+        with self._lock:
+            if version != self.version(namespace):
+                return
+            self._exact[(namespace, norm, version)] = (expires, value)
+            self._exact.move_to_end((namespace, norm, version))
+            if embedding is not None:
+                self._semantic[(namespace, norm)] = (expires, _unit(embedding), value)
+                self._semantic.move_to_end((namespace, norm))
+            for cache in (self._exact, self._semantic):
+                while len(cache) > self.max_entries:
+                    cache.popitem(last=False)
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Forget everything cached for `namespace`, or for all namespaces when None"""
+        with self._lock:
+            if namespace is None:
+                self._epoch += 1
+                self._exact.clear()
+                self._semantic.clear()
+                return
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            for cache in (self._exact, self._semantic):
+                for key in [k for k in cache if k[0] == namespace]:
+                    del cache[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self._counters.values())
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            return {
+                **self._counters,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "entries": len(self._exact),
+                "similarity_threshold": self.similarity_threshold,
+            }
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+import httpx
+from fastapi import HTTPException
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+GENERATION = 1
+INGESTION = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", GENERATION: "generation", INGESTION: "ingestion"}
+
+
+class Overloaded(HTTPException):
+    """The scheduler's queue for this priority is full; surfaced as 503 with Retry-After"""
+
+    def __init__(self, detail: str, retry_after: int = 1):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+# Provider errors worth retrying, by class name so the openai, pinecone and urllib3 SDKs are not imported here
+RETRYABLE_ERRORS = frozenset({
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "PineconeProtocolError", "ProtocolError", "MaxRetryError", "NewConnectionError",
+})
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Rate limits, server errors, timeouts and dropped connections. Other
+    4xx responses (bad request, auth, not found) fail the same way again.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "status", None)  # Pinecone API exceptions
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    return (
+        isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+        or type(error).__name__ in RETRYABLE_ERRORS
+    )
+
+
+class TokenBucket:
+    """
+    Refills at `rate` units per second up to `capacity`. A take larger than
+    the capacity is allowed once the bucket is full and leaves it in debt.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.level = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        needed = min(amount, self.capacity)
+        # Tolerance keeps float rounding from scheduling endless near-zero waits
+        return 0.0 if self.level >= needed - 1e-6 else (needed - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self._refill()
+            self.level -= amount
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the provider answered 429"""
+        if self.rate > 0:
+            self._refill()
+            self.level = min(self.level, 0)
+
+
+class Scheduler:
+    """
+    Admission control for calls against one rate-limited API. At most
+    `concurrency` calls run at once, each admitted only when the
+    requests-per-minute and tokens-per-minute buckets allow it. Waiting
+    calls are admitted strictly by priority (then arrival), so interactive
+    work overtakes generation and ingestion. Each priority has a bounded
+    queue; a call arriving at a full queue fails fast with Overloaded.
+
+    `clock` and `sleep` are injectable so the scheduler can run on a fake
+    clock (see bench_scheduler.py).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        queue_limits: Sequence[int] = (64, 16, 1024),
+        burst_seconds: float = 10,
+        attempts: int = 4,
+        base_delay: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        if len(queue_limits) != len(PRIORITY_NAMES) or any(limit < 0 for limit in queue_limits):
+            raise ValueError(
+                f"queue_limits needs {len(PRIORITY_NAMES)} non-negative limits "
+                f"(interactive, generation, ingestion), got {list(queue_limits)}"
+            )
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limits = dict(enumerate(queue_limits))
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.clock = clock
+        self.sleep = sleep
+        self._requests = TokenBucket(
+            requests_per_minute / 60, max(1.0, requests_per_minute / 60 * burst_seconds), clock
+        )
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * burst_seconds, clock)
+        self._active = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._waiting: Dict[int, int] = {p: 0 for p in self.queue_limits}
+        self._wakeup: Optional[asyncio.Task] = None
+        self._wakeup_at = None
+        self._counters = {
+            p: {"admitted": 0, "rejected": 0, "retried": 0, "wait_seconds": 0.0} for p in self.queue_limits
+        }
+
+    async def acquire(self, priority: int, tokens: int = 0) -> None:
+        if self._waiting[priority] >= self.queue_limits[priority]:
+            self._counters[priority]["rejected"] += 1
+            raise Overloaded(f"{self.name} is overloaded, retry shortly")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), tokens, future))
+        self._waiting[priority] += 1
+        queued_at = self.clock()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._waiting[priority] -= 1
+            else:
+                self.release()  # admitted just as the caller went away
+            raise
+        self._counters[priority]["admitted"] += 1
+        self._counters[priority]["wait_seconds"] += self.clock() - queued_at
+
+    def release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int, tokens: int = 0):
+        """Hold one admitted call for the duration of the block (e.g. a streamed completion)"""
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, make_call: Callable[[], Awaitable[object]], priority: int, tokens: int = 0):
+        """
+        Admit and await `make_call()`, retrying retryable failures (see
+        `is_retryable`) with exponential, jittered backoff outside the slot.
+        A 429 also empties the buckets so queued calls back off instead of
+        piling onto the limit.
+        """
+        for attempt in range(self.attempts):
+            async with self.slot(priority, tokens):
+                try:
+                    return await make_call()
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    if attempt == self.attempts - 1 or not is_retryable(e):
+                        raise
+                    if is_rate_limited(e):
+                        self._requests.drain()
+                        self._tokens.drain()
+                    error = e
+            delay = self.base_delay * (2 ** attempt) * (0.5 + random.random())
+            self._counters[priority]["retried"] += 1
+            print(f"{self.name} call failed ({error}), retrying in {delay:.2f}s")
+            await self.sleep(delay)
+
+    def _dispatch(self) -> None:
+        while self._heap and self._active < self.concurrency:
+            priority, _seq, tokens, future = self._heap[0]
+            if future.cancelled():
+                heapq.heappop(self._heap)
+                continue
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._heap)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._active += 1
+            self._waiting[priority] -= 1
+            future.set_result(None)
+
+    def _wake_in(self, delay: float) -> None:
+        wake_at = self.clock() + delay
+        if self._wakeup is not None and not self._wakeup.done():
+            if self._wakeup_at <= wake_at:
+                return
+            self._wakeup.cancel()
+        self._wakeup_at = wake_at
+        self._wakeup = asyncio.ensure_future(self._wake(delay))
+
+    async def _wake(self, delay: float) -> None:
+        await self.sleep(delay)
+        self._wakeup = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        self._requests.wait_time(0)  # refill before reporting levels
+        self._tokens.wait_time(0)
+        return {
+            "active": self._active,
+            "concurrency": self.concurrency,
+            "waiting": {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()},
+            "requests_available": self._requests.level if self._requests.rate > 0 else None,
+            "tokens_available": self._tokens.level if self._tokens.rate > 0 else None,
+            **{PRIORITY_NAMES[p]: dict(c) for p, c in self._counters.items()},
+        }
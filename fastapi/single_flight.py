@@ -0,0 +1,52 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async computations. Callers passing the
+    same key while a computation is in flight await that computation
+    instead of starting their own; a caller that disconnects does not
+    cancel it for the others. With `ttl_seconds` > 0 successful results are
+    also served to later callers for that long. Failures are never cached.
+    """
+
+    def __init__(self, ttl_seconds: float = 0, max_entries: int = 256, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._in_flight = {}
+        self._results = OrderedDict()
+        self._counters = {"computed": 0, "coalesced": 0, "cached": 0}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[object]]):
+        entry = self._results.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._results.move_to_end(key)
+                self._counters["cached"] += 1
+                return entry[1]
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self._counters["computed"] += 1
+        else:
+            self._counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if self.ttl_seconds > 0 and not task.cancelled() and task.exception() is None:
+            self._results[key] = (self.clock() + self.ttl_seconds, task.result())
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**self._counters, "in_flight": len(self._in_flight), "cached_results": len(self._results)}
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Optional, Union
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadBuffer:
+    """
+    An uploaded file, hashed as it is copied. Uploads up to `spool_bytes`
+    stay in memory and are parsed straight from there; larger ones are
+    written once to a temp file (without fsync, nothing needs them to
+    survive a crash). `source` is what the PDF parser takes: the bytes or
+    the temp file path.
+    """
+
+    def __init__(self, spool_bytes: int, dir: Optional[str] = None):
+        self.spool_bytes = spool_bytes
+        self.dir = dir
+        self.size = 0
+        self.path: Optional[str] = None
+        self._digest = hashlib.sha256()
+        self._memory = bytearray()
+        self._file = None
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        return self.path if self.path is not None else bytes(self._memory)
+
+    def write(self, data: bytes) -> None:
+        self._digest.update(data)
+        self.size += len(data)
+        if self._file is None and self.size > self.spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=self.dir)
+            self.path = self._file.name
+            self._file.write(self._memory)
+            self._memory = bytearray()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory += data
+
+    def finish(self) -> None:
+        """Close the temp file (if any) so other processes can read it"""
+        if self._file is not None:
+            self._file.close()
+
+    def discard(self) -> None:
+        self.finish()
+        self._memory = bytearray()
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+async def receive_upload(upload, max_bytes: int, spool_bytes: int, dir: Optional[str] = None) -> UploadBuffer:
+    """
+    Copy an UploadFile into an UploadBuffer READ_CHUNK_BYTES at a time,
+    raising UploadTooLarge as soon as more than `max_bytes` arrive. Disk
+    writes for spilled uploads run in a thread, one chunk at a time.
+    """
+    buffer = UploadBuffer(spool_bytes, dir=dir)
+    try:
+        while True:
+            chunk = await upload.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            if buffer.size + len(chunk) > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+            if buffer.path is None and buffer.size + len(chunk) <= spool_bytes:
+                buffer.write(chunk)
+            else:
+                await asyncio.to_thread(buffer.write, chunk)
+        buffer.finish()
+        return buffer
+    except BaseException:
+        buffer.discard()
+        raise
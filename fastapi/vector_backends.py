@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    import hnswlib
+except ImportError:  # optional; exact search is used without it
+    hnswlib = None
+
+TEXT_KEY = "text"
+
+SearchResults = List[Tuple[Document, float]]
+
+
+def _to_document(chunk_id: Optional[str], metadata: dict, score: float) -> Optional[Tuple[Document, float]]:
+    """Match PineconeVectorStore: the chunk text lives in the `text` metadata key"""
+    metadata = dict(metadata or {})
+    if TEXT_KEY not in metadata:
+        return None
+    text = metadata.pop(TEXT_KEY)
+    return Document(id=chunk_id, page_content=text, metadata=metadata), score
+
+
+class VectorBackend:
+    """
+    The vector index operations ingestion and retrieval rely on. Vectors are
+    Pinecone-style dicts ({"id", "values", "metadata"}) whose metadata carries
+    the chunk text under `text`; scores are cosine similarities. All methods
+    are blocking and are called from worker threads.
+    """
+
+    name = "base"
+    dimension: int
+
+    def upsert(self, vectors: Sequence[dict], namespace: str = "") -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[str], namespace: str = "") -> None:
+        raise NotImplementedError
+
+    def delete_all(self, namespace: str = "") -> None:
+        raise NotImplementedError
+
+    def count(self, namespace: str = "") -> int:
+        raise NotImplementedError
+
+    def existing(self, ids: Sequence[str], namespace: str = "") -> Set[str]:
+        """The subset of `ids` that is currently stored in `namespace`"""
+        raise NotImplementedError
+
+    def search(self, embedding: Sequence[float], k: int = 5, namespace: str = "") -> SearchResults:
+        raise NotImplementedError
+
+    def search_many(self, embeddings: Sequence[Sequence[float]], k: int = 5, namespace: str = "") -> List[SearchResults]:
+        return [self.search(embedding, k, namespace) for embedding in embeddings]
+
+
+class PineconeBackend(VectorBackend):
+    """Pinecone serverless index, one Pinecone namespace per tenant"""
+
+    name = "pinecone"
+
+    def __init__(self, index, dimension: int):
+        self.index = index
+        self.dimension = dimension
+
+    def upsert(self, vectors, namespace=""):
+        self.index.upsert(vectors=list(vectors), namespace=namespace)
+
+    def delete(self, ids, namespace=""):
+        self.index.delete(ids=list(ids), namespace=namespace)
+
+    def delete_all(self, namespace=""):
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def count(self, namespace=""):
+        # The default namespace may be reported as "" or "__default__"
+        namespaces = self.index.describe_index_stats().namespaces or {}
+        keys = [namespace] if namespace else ["", "__default__"]
+        return sum(namespaces[k].vector_count for k in keys if k in namespaces)
+
+    def existing(self, ids, namespace=""):
+        found = set()
+        ids = list(ids)
+        for i in range(0, len(ids), 100):
+            found.update(self.index.fetch(ids=ids[i:i+100], namespace=namespace).vectors)
+        return found
+
+    def search(self, embedding, k=5, namespace=""):
+        results = self.index.query(
+            vector=list(embedding), top_k=k, include_metadata=True, namespace=namespace
+        )
+        docs = []
+        for match in results["matches"]:
+            doc = _to_document(match.get("id"), match["metadata"], match["score"])
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
+
+class _LocalNamespace:
+    def __init__(self, path: str, dimension: int, ids: List[str]):
+        self.path = path
+        self.dimension = dimension
+        self.ids = ids
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self.matrix = None
+        self.ann = None
+        self.ann_dirty = True
+        if os.path.exists(path) and os.path.getsize(path):
+            capacity = os.path.getsize(path) // (4 * dimension)
+            self.matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dimension))
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def reserve(self, rows: int) -> None:
+        """Grow the backing file (doubling) so it holds at least `rows` vectors"""
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, self.capacity * 2, 256)
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def vectors(self) -> np.ndarray:
+        if self.matrix is None:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self.matrix[:len(self.ids)]
+
+
+class LocalVectorBackend(VectorBackend):
+    """
+    In-process vector index for development, CI and small per-user
+    documents. Each namespace is a float32 matrix of unit vectors,
+    memory-mapped from `<path>/<namespace hash>.f32`, searched with one
+    matrix product and an argpartition top-k. Ids and metadata live in
+    `<path>/index.sqlite3`, so the index survives restarts.
+
+    When `hnswlib` is installed, namespaces with at least `hnsw_threshold`
+    vectors are searched through an HNSW graph instead; the graph is rebuilt
+    on the first search after the namespace changes.
+    """
+
+    name = "local"
+
+    def __init__(self, path: str, dimension: int = 1536, hnsw_threshold: int = 50000):
+        self.path = path
+        self.dimension = dimension
+        self.hnsw_threshold = hnsw_threshold
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, _LocalNamespace] = {}
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                PRIMARY KEY (namespace, id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _file(self, namespace: str) -> str:
+        digest = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.path, f"{digest}.f32")
+
+    def _get(self, namespace: str) -> _LocalNamespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            rows = self._conn.execute(
+                "SELECT id FROM vectors WHERE namespace = ? ORDER BY row", (namespace,)
+            ).fetchall()
+            ns = self._namespaces[namespace] = _LocalNamespace(
+                self._file(namespace), self.dimension, [chunk_id for (chunk_id,) in rows]
+            )
+        return ns
+
+    def _unit(self, vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def upsert(self, vectors, namespace=""):
+        vectors = list(vectors)
+        if not vectors:
+            return
+        values = self._unit([v["values"] for v in vectors])
+        with self._lock:
+            ns = self._get(namespace)
+            rows = []
+            for vector in vectors:
+                row = ns.rows.get(vector["id"])
+                if row is None:
+                    row = ns.rows[vector["id"]] = len(ns.ids)
+                    ns.ids.append(vector["id"])
+                rows.append(row)
+            ns.reserve(len(ns.ids))
+            ns.matrix[rows] = values
+            ns.matrix.flush()
+            ns.ann_dirty = True
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (namespace, id, row, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (namespace, v["id"], row, json.dumps(v.get("metadata") or {}, default=str))
+                        for v, row in zip(vectors, rows)
+                    ],
+                )
+
+    def delete(self, ids, namespace=""):
+        with self._lock:
+            ns = self._get(namespace)
+            moved = {}
+            deleted = []
+            for chunk_id in ids:
+                row = ns.rows.pop(chunk_id, None)
+                if row is None:
+                    continue
+                deleted.append(chunk_id)
+                moved.pop(chunk_id, None)
+                # Keep the matrix dense: move the last vector into the freed row
+                last = len(ns.ids) - 1
+                last_id = ns.ids.pop()
+                if row != last:
+                    ns.matrix[row] = ns.matrix[last]
+                    ns.ids[row] = last_id
+                    ns.rows[last_id] = row
+                    moved[last_id] = row
+            if not deleted:
+                return
+            ns.matrix.flush()
+            ns.ann_dirty = True
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM vectors WHERE namespace = ? AND id = ?", [(namespace, i) for i in deleted]
+                )
+                self._conn.executemany(
+                    "UPDATE vectors SET row = ? WHERE namespace = ? AND id = ?",
+                    [(row, namespace, i) for i, row in moved.items()],
+                )
+
+    def delete_all(self, namespace=""):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            with self._conn:
+                self._conn.execute("DELETE FROM vectors WHERE namespace = ?", (namespace,))
+            if os.path.exists(self._file(namespace)):
+                os.unlink(self._file(namespace))
+
+    def count(self, namespace=""):
+        with self._lock:
+            return len(self._get(namespace).ids)
+
+    def existing(self, ids, namespace=""):
+        with self._lock:
+            rows = self._get(namespace).rows
+            return {chunk_id for chunk_id in ids if chunk_id in rows}
+
+    def search(self, embedding, k=5, namespace=""):
+        return self.search_many([embedding], k, namespace)[0]
+
+    def search_many(self, embeddings, k=5, namespace=""):
+        """Top-k for several query vectors with a single matrix product"""
+        queries = self._unit(embeddings)
+        with self._lock:
+            ns = self._get(namespace)
+            n = len(ns.ids)
+            k = min(k, n)
+            if k == 0:
+                return [[] for _ in range(len(queries))]
+            if hnswlib is not None and n >= self.hnsw_threshold:
+                rows, scores = self._ann_search(ns, queries, k)
+            else:
+                similarities = ns.vectors() @ queries.T  # (n, queries)
+                top = np.argpartition(-similarities, k - 1, axis=0)[:k]
+                top_scores = np.take_along_axis(similarities, top, axis=0)
+                order = np.argsort(-top_scores, axis=0)
+                rows = np.take_along_axis(top, order, axis=0).T
+                scores = np.take_along_axis(top_scores, order, axis=0).T
+            hit_ids = [[ns.ids[r] for r in query_rows] for query_rows in rows]
+            metadata = self._metadata(namespace, {i for ids in hit_ids for i in ids})
+        results = []
+        for ids, query_scores in zip(hit_ids, scores):
+            docs = [_to_document(i, metadata.get(i), float(s)) for i, s in zip(ids, query_scores)]
+            results.append([doc for doc in docs if doc is not None])
+        return results
+
+    def _ann_search(self, ns: _LocalNamespace, queries: np.ndarray, k: int):
+        if ns.ann is None or ns.ann_dirty:
+            vectors = ns.vectors()
+            ann = hnswlib.Index(space="ip", dim=self.dimension)
+            ann.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+            ann.add_items(vectors, np.arange(len(vectors)))
+            ns.ann = ann
+            ns.ann_dirty = False
+        ns.ann.set_ef(max(200, k * 4))
+        rows, distances = ns.ann.knn_query(queries, k=k)
+        return rows, 1.0 - distances  # hnswlib's "ip" distance is 1 - dot product
+
+    def _metadata(self, namespace: str, ids) -> dict:
+        ids = list(ids)
+        found = {}
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i+500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT id, metadata FROM vectors WHERE namespace = ? AND id IN ({placeholders})",
+                [namespace, *batch],
+            ).fetchall()
+            found.update((chunk_id, json.loads(meta)) for chunk_id, meta in rows)
+        return found
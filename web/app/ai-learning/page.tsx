@@ -18,6 +18,7 @@ export default function AILearning() {
   const [messages, setMessages] = useState<Message[]>([])
   const [inputMessage, setInputMessage] = useState('')
   const [isProcessing, setIsProcessing] = useState(false)
+  const [streamingId, setStreamingId] = useState<string | null>(null)
   const [documentsProcessed, setDocumentsProcessed] = useState(0)
 
   const handleUploadSuccess = (data: any) => {
@@ -58,11 +59,22 @@ export default function AILearning() {
     setInputMessage('')
     setIsProcessing(true)
 
+    const aiMessageId = (Date.now() + 1).toString()
+    // Show the answer as it streams in: create the message on the first event, then grow it
+    const showAnswer = (text: string) => {
+      setStreamingId(aiMessageId)
+      setMessages(prev =>
+        prev.some(m => m.id === aiMessageId)
+          ? prev.map(m => (m.id === aiMessageId ? { ...m, text } : m))
+          : [...prev, { id: aiMessageId, text, isUser: false, timestamp: new Date() }]
+      )
+    }
+
     try {
-      console.log('Sending message to AI chat API:', currentMessage)
+      console.log('Sending message to AI chat stream API:', currentMessage)
       
-      // Send message to AI chat API
-      const response = await fetch('/api/ai-chat', {
+      // Stream the answer from the AI chat API as Server-Sent Events
+      const response = await fetch('/api/ai-chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -73,25 +85,33 @@ export default function AILearning() {
       })
 
       console.log('API response status:', response.status)
-      const result = await response.json()
-      console.log('API response data:', result)
-
-      if (result.success) {
-        const aiResponse: Message = {
-          id: (Date.now() + 1).toString(),
-          text: result.response,
-          isUser: false,
-          timestamp: new Date()
-        }
-        setMessages(prev => [...prev, aiResponse])
+      if (!response.ok || !response.body) {
+        const result = await response.json().catch(() => ({ error: 'Unknown error' }))
+        showAnswer(`Sorry, I encountered an error: ${result.error}. Please try again.`)
       } else {
-        const errorResponse: Message = {
-          id: (Date.now() + 1).toString(),
-          text: `Sorry, I encountered an error: ${result.error}. Please try again.`,
-          isUser: false,
-          timestamp: new Date()
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ''
+        let answer = ''
+        while (true) {
+          const { done, value } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+          const events = buffer.split('\n\n')
+          buffer = events.pop() || ''
+          for (const rawEvent of events) {
+            const event = rawEvent.match(/^event: (.*)$/m)?.[1]
+            const data = rawEvent.match(/^data: (.*)$/m)?.[1]
+            if (!event || data === undefined) continue
+            const payload = JSON.parse(data)
+            if (event === 'token') {
+              answer += payload.text
+              showAnswer(answer.replace(/\*\*/g, ''))
+            } else if (event === 'error') {
+              showAnswer(`Sorry, I encountered an error: ${payload.detail}. Please try again.`)
+            }
+          }
         }
-        setMessages(prev => [...prev, errorResponse])
       }
     } catch (error) {
       console.error('Fetch error:', error)
@@ -104,6 +124,7 @@ export default function AILearning() {
       setMessages(prev => [...prev, errorResponse])
     }
 
+    setStreamingId(null)
     setIsProcessing(false)
   }
 
@@ -230,7 +251,7 @@ export default function AILearning() {
                     ))
                   )}
 
-                  {isProcessing && (
+                  {isProcessing && !streamingId && (
                     <div className="flex justify-start">
                       <div className="bg-gray-100 text-gray-900 max-w-xs lg:max-w-md px-4 py-3 rounded-2xl">
                         <div className="flex items-center">
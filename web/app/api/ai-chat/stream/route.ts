@@ -0,0 +1,52 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { getUserHeaders } from '@/lib/auth'
+
+const FASTAPI_BASE_URL = process.env.FASTAPI_BASE_URL || 'http://localhost:8000'
+
+export async function POST(request: NextRequest) {
+  try {
+    const { query } = await request.json()
+
+    if (!query || typeof query !== 'string' || !query.trim()) {
+      return NextResponse.json(
+        { error: 'Query is required and must be a non-empty string' },
+        { status: 400 }
+      )
+    }
+
+    // Stream Server-Sent Events from the FastAPI backend straight through
+    const response = await fetch(`${FASTAPI_BASE_URL}/query/stream?query=${encodeURIComponent(query.trim())}`, {
+      method: 'POST',
+      headers: getUserHeaders(request),
+    })
+
+    if (!response.ok || !response.body) {
+      const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }))
+      return NextResponse.json(
+        { 
+          error: errorData.detail || 'Failed to get AI response',
+          success: false 
+        },
+        { status: response.status }
+      )
+    }
+
+    return new Response(response.body, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+      }
+    })
+
+  } catch (error) {
+    console.error('AI chat stream error:', error)
+    return NextResponse.json(
+      { 
+        error: 'Internal server error during AI chat',
+        success: false 
+      },
+      { status: 500 }
+    )
+  }
+}
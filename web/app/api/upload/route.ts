@@ -1,4 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server'
+import { getUserHeaders } from '@/lib/auth'
 
 const FASTAPI_BASE_URL = process.env.FASTAPI_BASE_URL || 'http://localhost:8000'
 
@@ -39,6 +40,7 @@ export async function POST(request: NextRequest) {
     // Forward the file to FastAPI backend
     const response = await fetch(`${FASTAPI_BASE_URL}/upload-documents`, {
       method: 'POST',
+      headers: getUserHeaders(request),
       body: fastApiFormData,
     })
 
@@ -59,6 +61,7 @@ export async function POST(request: NextRequest) {
       success: true,
       message: result.message,
       documents_processed: result.documents_processed,
+      warning: result.warning,
       filename: file.name
     })
 
@@ -1,4 +1,5 @@
 import jwt from 'jsonwebtoken'
+import type { NextRequest } from 'next/server'
 import { supabase } from './supabase'
 
 export interface User {
@@ -116,3 +117,11 @@ export const verifyToken = (token: string) => {
     return null
   }
 }
+
+// Scopes backend calls to the signed-in user's document namespace.
+// FastAPI verifies the token itself with the same JWT_SECRET.
+export const getUserHeaders = (request: NextRequest): Record<string, string> => {
+  const token = request.cookies.get('auth-token')?.value
+  const payload = token ? verifyToken(token) : null
+  return payload ? { Authorization: `Bearer ${token}` } : {}
+}